@@ -0,0 +1,127 @@
+"""Semantic cache of chat answers: near-duplicate questions about the same documents reuse an answer."""
+
+from __future__ import annotations
+
+import hashlib
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from itertools import count
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from backend.embeddings import get_embedding_service
+
+
+# Minimum cosine similarity between question embeddings for a cached answer to be reused
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", 0.92))
+ANSWER_CACHE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", 24 * 60 * 60))
+# 0 disables the cache
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", 2000))
+
+
+def content_key(doc_ids: Sequence[str], filenames: Sequence[str], model: str) -> str:
+    """Identify what an answer depends on: the documents, the names sources are shown under, and the model."""
+    digest = hashlib.sha256(model.encode())
+    for doc_id, filename in sorted(zip(doc_ids, filenames)):
+        digest.update(b"\0" + doc_id.encode() + b"\0" + filename.encode())
+    return digest.hexdigest()
+
+
+def _normalize(vector: Sequence[float]) -> List[float]:
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return [value / norm for value in vector]
+
+
+@dataclass
+class CachedAnswer:
+    content: str
+    question: str
+    vector: List[float]
+    answer: str
+    sources: str
+    created_at: float
+
+
+class SemanticAnswerCache:
+    """
+    In-memory, LRU-bounded answers grouped by content key. A lookup embeds
+    the question and returns the most similar cached answer for the same
+    content if it clears the threshold.
+    """
+
+    def __init__(self, threshold: float, ttl_seconds: int, max_entries: int):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()
+        self._by_content: Dict[str, Set[int]] = {}
+        self._ids = count()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = {"lru": 0, "ttl": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def lookup(self, content: str, question: str) -> Tuple[Optional[CachedAnswer], List[float]]:
+        """
+        Return (cached answer or None, normalized question embedding); pass the
+        embedding back to store() on a miss. Blocking: run on the worker pool.
+        """
+        vector = _normalize(get_embedding_service().embed_query(question))
+        now = time.time()
+        with self._lock:
+            best, best_score = None, self.threshold
+            for entry_id in list(self._by_content.get(content, ())):
+                entry = self._entries[entry_id]
+                if self.ttl_seconds > 0 and now - entry.created_at > self.ttl_seconds:
+                    self._remove(entry_id, "ttl")
+                    continue
+                score = sum(a * b for a, b in zip(vector, entry.vector))
+                if score >= best_score:
+                    best, best_score = entry_id, score
+            if best is None:
+                self._misses += 1
+                return None, vector
+            self._hits += 1
+            self._entries.move_to_end(best)
+            return self._entries[best], vector
+
+    def store(self, content: str, question: str, vector: List[float], answer: str, sources: str):
+        if not self.enabled:
+            return
+        with self._lock:
+            entry_id = next(self._ids)
+            self._entries[entry_id] = CachedAnswer(content, question, vector, answer, sources, time.time())
+            self._by_content.setdefault(content, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)), "lru")
+
+    def _remove(self, entry_id: int, reason: str):
+        entry = self._entries.pop(entry_id)
+        ids = self._by_content[entry.content]
+        ids.discard(entry_id)
+        if not ids:
+            del self._by_content[entry.content]
+        self._evictions[reason] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "maxEntries": self.max_entries,
+                "threshold": self.threshold,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hitRate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "evictions": dict(self._evictions),
+            }
+
+
+answer_cache = SemanticAnswerCache(ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_TTL_SECONDS, ANSWER_CACHE_MAX_ENTRIES)
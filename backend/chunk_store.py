@@ -0,0 +1,215 @@
+"""Compact chunk storage: one text buffer with offsets per document instead of a Document per chunk."""
+
+from __future__ import annotations
+
+import sys
+import threading
+from array import array
+from typing import Dict, Iterator, List, Optional, Sequence, Union
+
+from langchain_core.documents import Document
+
+
+# Placed between chunks that do not overlap, as the old " ".join of chunk texts did
+SEPARATOR = " "
+# Shortest repeated text taken as the splitter's overlap; shorter matches are
+# more likely coincidence, and merging those would drop text from the document view
+MIN_OVERLAP_CHARS = 16
+
+
+class Chunk:
+    """
+    Read-only view of one stored chunk with the page_content and metadata of
+    a Document. metadata is a fresh dict on every access; use to_document()
+    for anything handed to LangChain or changed afterwards.
+    """
+
+    __slots__ = ("store", "index")
+
+    def __init__(self, store: "ChunkStore", index: int):
+        self.store = store
+        self.index = index
+
+    @property
+    def page_content(self) -> str:
+        return self.store.text_at(self.index)
+
+    @property
+    def metadata(self) -> dict:
+        return self.store.metadata_at(self.index)
+
+    def to_document(self) -> Document:
+        return Document(page_content=self.page_content, metadata=self.metadata)
+
+
+class ChunkStore:
+    """
+    The chunks of one document. Chunk texts are slices of a single buffer, so
+    the overlap the splitter repeats at the start of each chunk is stored
+    once, and each distinct metadata dict (source, path, page) is stored once
+    and referenced by id. The buffer doubles as the document's text for
+    prompts. Appending is thread-safe; readers see the chunks appended so far.
+    """
+
+    def __init__(self, doc_id: str = ""):
+        self.doc_id = doc_id
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        # Appended pieces of the buffer, joined on the next read
+        self._parts: List[str] = []
+        self._size = 0
+        self._starts = array("q")
+        self._lengths = array("q")
+        self._metadata_ids = array("l")
+        self._metadata: List[dict] = []
+        self._metadata_index: Dict[tuple, int] = {}
+        self._last = ""
+        self._last_metadata_id = -1
+
+    @classmethod
+    def from_documents(cls, documents: Sequence[Document], doc_id: str = "") -> "ChunkStore":
+        store = cls(doc_id)
+        for document in documents:
+            store.append(document.page_content, document.metadata)
+        return store
+
+    @classmethod
+    def from_payload(cls, payload: Union[dict, list], doc_id: str = "") -> "ChunkStore":
+        """Rebuild a store saved by to_payload(), or from the older [[text, metadata], ...] form."""
+        if isinstance(payload, list):
+            return cls.from_documents([Document(page_content=text, metadata=metadata) for text, metadata in payload], doc_id)
+        store = cls(doc_id)
+        text = payload["text"]
+        store._parts = [text] if text else []
+        store._size = len(text)
+        store._starts.extend(payload["starts"])
+        store._lengths.extend(payload["lengths"])
+        store._metadata_ids.extend(payload["metadataIds"])
+        for metadata in payload["metadata"]:
+            store._metadata_id(metadata)
+        if len(store):
+            store._last = store.text_at(len(store) - 1)
+            store._last_metadata_id = store._metadata_ids[-1]
+        return store
+
+    def to_payload(self) -> dict:
+        with self._lock:
+            return {
+                "text": self._buffer(),
+                "starts": self._starts.tolist(),
+                "lengths": self._lengths.tolist(),
+                "metadataIds": self._metadata_ids.tolist(),
+                "metadata": list(self._metadata),
+            }
+
+    def append(self, text: str, metadata: dict):
+        with self._lock:
+            metadata_id = self._metadata_id(metadata)
+            # Only chunks split from the same run of text overlap
+            overlap = self._overlap(text) if metadata_id == self._last_metadata_id else 0
+            if not overlap and self._size:
+                self._parts.append(SEPARATOR)
+                self._size += len(SEPARATOR)
+            start = self._size - overlap
+            if len(text) > overlap:
+                self._parts.append(text[overlap:])
+                self._size += len(text) - overlap
+            self._starts.append(start)
+            self._lengths.append(len(text))
+            self._metadata_ids.append(metadata_id)
+            self._last = text
+            self._last_metadata_id = metadata_id
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+
+    def _metadata_id(self, metadata: dict) -> int:
+        # Caller holds the lock (or owns the store); doc_id is the store's, not per chunk
+        metadata = {key: sys.intern(value) if isinstance(value, str) else value for key, value in metadata.items() if key != "doc_id"}
+        try:
+            key = tuple(sorted(metadata.items()))
+            hash(key)
+        except TypeError:
+            key = None
+        metadata_id = self._metadata_index.get(key) if key is not None else None
+        if metadata_id is None:
+            metadata_id = len(self._metadata)
+            self._metadata.append(metadata)
+            if key is not None:
+                self._metadata_index[key] = metadata_id
+        return metadata_id
+
+    def _overlap(self, text: str) -> int:
+        """Length of the longest suffix of the previous chunk that starts this one, at a word boundary."""
+        last = self._last
+        head = text[:MIN_OVERLAP_CHARS]
+        if len(head) < MIN_OVERLAP_CHARS:
+            return 0
+        position = last.find(head, max(0, len(last) - len(text)))
+        while position != -1:
+            if (position == 0 or last[position - 1].isspace()) and text.startswith(last[position:]):
+                return len(last) - position
+            position = last.find(head, position + 1)
+        return 0
+
+    def _buffer(self) -> str:
+        # Caller holds the lock
+        if len(self._parts) > 1:
+            self._parts = ["".join(self._parts)]
+        return self._parts[0] if self._parts else ""
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    def __iter__(self) -> Iterator[Chunk]:
+        return (Chunk(self, i) for i in range(len(self)))
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[Chunk, List[Chunk]]:
+        if isinstance(index, slice):
+            return [Chunk(self, i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("chunk index out of range")
+        return Chunk(self, index)
+
+    def text(self) -> str:
+        """The whole document as stored: overlapping chunks merged, the rest separated by SEPARATOR."""
+        with self._lock:
+            return self._buffer()
+
+    def text_at(self, index: int) -> str:
+        with self._lock:
+            start = self._starts[index]
+            return self._buffer()[start:start + self._lengths[index]]
+
+    def metadata_at(self, index: int) -> dict:
+        metadata = dict(self._metadata[self._metadata_ids[index]])
+        if self.doc_id:
+            metadata["doc_id"] = self.doc_id
+        return metadata
+
+    def texts(self, start: int = 0, stop: Optional[int] = None) -> List[str]:
+        with self._lock:
+            buffer = self._buffer()
+            spans = list(zip(self._starts[start:stop], self._lengths[start:stop]))
+        return [buffer[offset:offset + length] for offset, length in spans]
+
+    def documents(self, start: int = 0, stop: Optional[int] = None) -> List[Document]:
+        """Chunks start..stop as LangChain Documents, for vector stores and retrievers."""
+        stop = len(self) if stop is None else stop
+        return [
+            Document(page_content=text, metadata=self.metadata_at(i))
+            for i, text in zip(range(start, stop), self.texts(start, stop))
+        ]
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate footprint: buffer characters, offset arrays and the distinct metadata strings."""
+        with self._lock:
+            arrays = sum(values.itemsize * len(values) for values in (self._starts, self._lengths, self._metadata_ids))
+            metadata = sum(len(str(value)) for metadata in self._metadata for value in metadata.values())
+            return self._size + arrays + metadata
@@ -0,0 +1,55 @@
+"""Incremental chunker that splits a stream of text segments without joining the whole document."""
+
+from __future__ import annotations
+
+from typing import Iterable, Iterator, Tuple
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+# Buffered characters that trigger a split; only the last, possibly incomplete chunk is carried over
+FLUSH_CHARS = CHUNK_SIZE * 16
+
+
+def iter_chunks(
+    segments: Iterable[Tuple[str, dict]],
+    chunk_size: int = CHUNK_SIZE,
+    chunk_overlap: int = CHUNK_OVERLAP,
+    flush_chars: int = FLUSH_CHARS,
+) -> Iterator[Document]:
+    """
+    Split (text, metadata) segments into chunks as they arrive. Consecutive
+    segments with equal metadata are chunked as one continuous text; a change
+    of metadata (e.g. a new PDF page) starts a new run.
+    """
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    pending = []
+    pending_chars = 0
+    metadata = None
+
+    for text, segment_metadata in segments:
+        if pending and segment_metadata != metadata:
+            for piece in splitter.split_text("".join(pending)):
+                yield Document(page_content=piece, metadata=dict(metadata))
+            pending = []
+            pending_chars = 0
+        metadata = segment_metadata
+        pending.append(text)
+        pending_chars += len(text)
+
+        if pending_chars >= flush_chars:
+            buffer = "".join(pending)
+            pieces = splitter.split_text(buffer)
+            for piece in pieces[:-1]:
+                yield Document(page_content=piece, metadata=dict(metadata))
+            # Re-split the raw tail with the text that follows
+            carry = buffer[buffer.rfind(pieces[-1]):] if pieces else ""
+            pending = [carry]
+            pending_chars = len(carry)
+
+    if pending:
+        for piece in splitter.split_text("".join(pending)):
+            yield Document(page_content=piece, metadata=dict(metadata))
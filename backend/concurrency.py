@@ -0,0 +1,67 @@
+"""Shared execution limits so blocking work never runs on the event loop."""
+
+from __future__ import annotations
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import Callable, Optional, TypeVar
+
+
+# Threads for parsing, chunking, embedding and vector-store calls.
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", min(4, os.cpu_count() or 1)))
+# Threads for short blocking I/O (SQLite stores, file copies) so it never queues behind CPU work.
+IO_WORKERS = int(os.getenv("IO_WORKERS", 8))
+# Maximum number of LLM requests in flight per worker.
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", 8))
+
+T = TypeVar("T")
+
+_executor = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix="cpu-worker")
+_io_executor = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="io-worker")
+_llm_semaphore: Optional[asyncio.Semaphore] = None
+
+
+async def run_in_pool(fn: Callable[..., T], *args, **kwargs) -> T:
+    """Run a blocking callable on the bounded worker pool and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, partial(fn, *args, **kwargs))
+
+
+async def run_io(fn: Callable[..., T], *args, **kwargs) -> T:
+    """Run a short blocking I/O call (e.g. a SQLite lookup) on the I/O pool and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_io_executor, partial(fn, *args, **kwargs))
+
+
+@asynccontextmanager
+async def llm_slot():
+    """Hold one of the LLM_CONCURRENCY slots for the duration of an LLM call."""
+    global _llm_semaphore
+    if _llm_semaphore is None:
+        _llm_semaphore = asyncio.Semaphore(LLM_CONCURRENCY)
+    async with _llm_semaphore:
+        yield
+
+
+def submit_to_pool(fn: Callable[..., T], *args, **kwargs):
+    """Schedule a blocking callable on the worker pool without waiting for it."""
+    return _executor.submit(fn, *args, **kwargs)
+
+
+def submit_io(fn: Callable[..., T], *args, **kwargs):
+    """Schedule a short blocking I/O call on the I/O pool without waiting for it."""
+    return _io_executor.submit(fn, *args, **kwargs)
+
+
+def pool_stats() -> dict:
+    return {
+        "cpuWorkers": CPU_WORKERS,
+        "cpuQueueDepth": _executor._work_queue.qsize(),
+        "ioWorkers": IO_WORKERS,
+        "ioQueueDepth": _io_executor._work_queue.qsize(),
+        "llmConcurrency": LLM_CONCURRENCY,
+        "llmSlotsFree": _llm_semaphore._value if _llm_semaphore else LLM_CONCURRENCY,
+    }
@@ -0,0 +1,148 @@
+"""Per-session chat memory: recent turns verbatim, older turns folded into a rolling summary."""
+
+from __future__ import annotations
+
+import asyncio
+import os
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from backend.concurrency import run_io
+from backend.poc_app import asummarize_history
+from backend.prompting import estimate_tokens, fit_to_budget
+from backend.session_store import session_store
+
+
+# Budget for verbatim recent turns; older turns are summarized once it is exceeded
+CHAT_HISTORY_TOKENS = int(os.getenv("CHAT_HISTORY_TOKENS", 600))
+CHAT_SUMMARY_TOKENS = int(os.getenv("CHAT_SUMMARY_TOKENS", 250))
+# Longest single question or answer kept in history
+TURN_TOKENS = 200
+DEFAULT_CONVERSATION = "default"
+
+
+def render_turn(question: str, answer: str) -> str:
+    return f"Student: {fit_to_budget(question, TURN_TOKENS)}\nAssistant: {fit_to_budget(answer, TURN_TOKENS)}"
+
+
+@dataclass
+class Conversation:
+    summary: str = ""
+    turns: List[Tuple[str, str]] = field(default_factory=list)
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock, repr=False)
+    # Stored revision this copy reflects; 0 until first saved
+    revision: int = 0
+
+    @property
+    def empty(self) -> bool:
+        return not self.summary and not self.turns
+
+    def history(self) -> str:
+        """Summary plus recent turns, bounded by CHAT_SUMMARY_TOKENS + CHAT_HISTORY_TOKENS."""
+        parts = []
+        if self.summary:
+            parts.append("Summary of earlier conversation: " + fit_to_budget(self.summary, CHAT_SUMMARY_TOKENS))
+        recent = []
+        used = 0
+        for question, answer in reversed(self.turns):
+            turn = render_turn(question, answer)
+            used += estimate_tokens(turn)
+            if used > CHAT_HISTORY_TOKENS:
+                break
+            recent.append(turn)
+        parts.extend(reversed(recent))
+        return "\n\n".join(parts)
+
+    def overflow(self) -> int:
+        """Number of oldest turns to fold into the summary so the rest fits in half the budget."""
+        costs = [estimate_tokens(render_turn(question, answer)) for question, answer in self.turns]
+        if sum(costs) <= CHAT_HISTORY_TOKENS:
+            return 0
+        # Compacting down to half the budget leaves room for several turns before the next summary
+        remaining = sum(costs)
+        count = 0
+        while count < len(costs) - 1 and remaining > CHAT_HISTORY_TOKENS // 2:
+            remaining -= costs[count]
+            count += 1
+        return count
+
+    def to_dict(self) -> dict:
+        return {"summary": self.summary, "turns": [list(turn) for turn in self.turns]}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Conversation":
+        return cls(summary=data.get("summary", ""), turns=[tuple(turn) for turn in data.get("turns", [])])
+
+    def load(self, data: dict, revision: int):
+        self.summary = data.get("summary", "")
+        self.turns = [tuple(turn) for turn in data.get("turns", [])]
+        self.revision = revision
+
+
+async def _refresh(file_id: str, conversation_id: str, conversation: Conversation):
+    """Catch up with turns other workers recorded. Caller holds conversation.lock."""
+    stored = await run_io(session_store.load_conversation, file_id, conversation_id)
+    if stored is None:
+        if conversation.revision:
+            # Deleted from the store (e.g. the session was removed); start over
+            conversation.load({}, 0)
+    elif stored[1] != conversation.revision:
+        conversation.load(*stored)
+
+
+async def get_conversation(entry, file_id: str, conversation_id: Optional[str]) -> Conversation:
+    """
+    The session's conversation, brought up to date with the session store
+    so every worker sees turns recorded by the others.
+    """
+    conversation_id = conversation_id or DEFAULT_CONVERSATION
+    conversation = entry.conversations.setdefault(conversation_id, Conversation())
+    if session_store is not None:
+        async with conversation.lock:
+            await _refresh(file_id, conversation_id, conversation)
+    return conversation
+
+
+async def _save(file_id: str, conversation_id: str, conversation: Conversation) -> bool:
+    revision = await run_io(
+        session_store.save_conversation, file_id, conversation_id, conversation.to_dict(), conversation.revision
+    )
+    if revision is None:
+        return False
+    conversation.revision = revision
+    return True
+
+
+async def record_turn(file_id: str, conversation_id: Optional[str], conversation: Conversation, question: str, answer: str):
+    """
+    Append a turn and summarize the oldest ones if recent history is over
+    budget. Saves are compare-and-swap on the stored revision: a worker that
+    lost a race reloads the conversation and applies its change again.
+    """
+    conversation_id = conversation_id or DEFAULT_CONVERSATION
+    async with conversation.lock:
+        if session_store is None:
+            conversation.turns.append((question, answer))
+        else:
+            while True:
+                await _refresh(file_id, conversation_id, conversation)
+                conversation.turns.append((question, answer))
+                if await _save(file_id, conversation_id, conversation):
+                    break
+                print(f"Conversation {conversation_id} of session {file_id} changed concurrently; retrying")
+
+        count = conversation.overflow()
+        if not count:
+            return
+        summary, folded_turns = conversation.summary, conversation.turns[:count]
+        folded = "\n\n".join(render_turn(q, a) for q, a in folded_turns)
+        compacted = fit_to_budget(await asummarize_history(summary, folded), CHAT_SUMMARY_TOKENS)
+        while True:
+            # Only fold if nobody else compacted these turns in the meantime
+            if conversation.summary != summary or conversation.turns[:count] != folded_turns:
+                return
+            conversation.summary = compacted
+            del conversation.turns[:count]
+            if session_store is None or await _save(file_id, conversation_id, conversation):
+                return
+            await _refresh(file_id, conversation_id, conversation)
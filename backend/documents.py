@@ -0,0 +1,281 @@
+"""Content-addressed store of ingested documents shared between upload sessions."""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import shutil
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from langchain_core.documents import Document
+
+from backend.chunk_store import ChunkStore
+from backend.embeddings import get_embedding_service
+from backend.concurrency import submit_to_pool
+from backend.poc_app import INDEX_BATCH_SIZE, add_chunks_to_vector_db, create_vector_db, iter_document_chunks
+from backend.retrieval import BM25Index
+from backend.session_store import SessionStore, session_store
+
+
+DOCUMENT_STORE_DIR = os.getenv("DOCUMENT_STORE_DIR", "./cache/documents")
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def hash_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@dataclass
+class StoredDocument:
+    """
+    One unique upload: its file on disk, its chunks and its Chroma collection.
+    Sessions that upload the same bytes share a single instance.
+    """
+    doc_id: str
+    path: Path
+    filename: str
+    chunks: ChunkStore
+    refcount: int = 0
+    vector_store: any = None
+    indexed_chunks: int = 0
+    index_lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+    lexical_index: Optional[BM25Index] = field(default=None, repr=False)
+    closed: bool = False
+
+    @property
+    def collection_name(self) -> str:
+        # Chroma collection names are limited to 63 characters
+        return f"doc_{self.doc_id[:48]}"
+
+    def ensure_index(self):
+        """
+        Create the document's collection on first use and embed any chunks not indexed yet.
+        """
+        with self.index_lock:
+            if self.closed:
+                raise RuntimeError(f"Document {self.doc_id} was released")
+            if self.vector_store is None:
+                self.vector_store = create_vector_db([], collection_name=self.collection_name)
+                # A collection persisted by an earlier run already holds these chunks
+                if self.vector_store._collection.count() == len(self.chunks):
+                    self.indexed_chunks = len(self.chunks)
+            # Chunks may still be appended by ingestion; index what exists now
+            stop = len(self.chunks)
+            if self.indexed_chunks < stop:
+                pending = self.chunks.documents(self.indexed_chunks, stop)
+                add_chunks_to_vector_db(self.vector_store, pending, start=self.indexed_chunks)
+                self.indexed_chunks = stop
+        return self.vector_store
+
+    def ensure_lexical_index(self) -> BM25Index:
+        """BM25 index over the chunks, rebuilt if chunks were appended since it was built."""
+        index = self.lexical_index
+        if index is None or index.size != len(self.chunks):
+            index = BM25Index(self.chunks)
+            self.lexical_index = index
+        return index
+
+    def close(self):
+        try:
+            self.path.unlink(missing_ok=True)
+        except OSError as e:
+            print(f"Error deleting document file {self.path}: {e}")
+        with self.index_lock:
+            self.closed = True
+            try:
+                # The collection may have been persisted by another worker or an earlier run
+                store = self.vector_store or create_vector_db([], collection_name=self.collection_name)
+                store.delete_collection()
+            except Exception as e:
+                print(f"Error deleting document collection: {e}")
+            self.vector_store = None
+
+
+class DocumentStore:
+    """
+    Deduplicates uploads by sha256: each distinct file is stored, chunked and
+    embedded once, and reference counted by the sessions using it.
+    Documents are kept in memory while a live session references them; with a
+    persistence store their chunks are saved so other workers and later runs
+    can load them again, and files are only deleted once no persisted
+    session references them.
+    """
+
+    def __init__(self, directory: str, persistence: Optional[SessionStore] = None):
+        self.directory = Path(directory)
+        self.persistence = persistence
+        self._documents: Dict[str, StoredDocument] = {}
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self._hits = 0
+        self._misses = 0
+
+    def _key_lock(self, doc_id: str) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(doc_id, threading.Lock())
+
+    def ingest(self, temp_path: Path, filename: str, doc_id: Optional[str] = None) -> Optional[StoredDocument]:
+        """
+        Take ownership of an uploaded temp file and return its shared document,
+        with one reference held for the caller. Returns None when no text can be
+        extracted. Blocking: run on the worker pool.
+        """
+        doc_id = doc_id or hash_file(temp_path)
+        # Serialize ingestion of the same bytes so concurrent uploads chunk it only once
+        with self._key_lock(doc_id):
+            with self._lock:
+                document = self._documents.get(doc_id)
+                if document is not None:
+                    document.refcount += 1
+                    self._hits += 1
+            if document is None:
+                document = self._load(doc_id)
+                if document is not None:
+                    self._hits += 1
+            if document is not None:
+                temp_path.unlink(missing_ok=True)
+                return document
+
+            self.directory.mkdir(parents=True, exist_ok=True)
+            path = self.directory / f"{doc_id}{temp_path.suffix.lower()}"
+            shutil.move(str(temp_path), path)
+            document = StoredDocument(doc_id=doc_id, path=path, filename=filename, chunks=ChunkStore(doc_id), refcount=1)
+            try:
+                for chunk in iter_document_chunks(path, source_name=filename):
+                    document.chunks.append(chunk.page_content, chunk.metadata)
+                    # Embed finished batches while later pages are still being extracted
+                    if len(document.chunks) % INDEX_BATCH_SIZE == 0:
+                        submit_to_pool(document.ensure_index)
+            except Exception as e:
+                print("Error:", str(e))
+                document.chunks.clear()
+            if not document.chunks:
+                document.close()
+                return None
+            if self.persistence is not None:
+                self.persistence.save_document(doc_id, path, filename, document.chunks)
+
+            with self._lock:
+                self._documents[doc_id] = document
+                self._misses += 1
+            return document
+
+    def acquire(self, doc_id: str) -> Optional[StoredDocument]:
+        """
+        Return a reference to a document, loading it from the persistence
+        store if this process has not seen it. Blocking: run on the worker pool.
+        """
+        with self._key_lock(doc_id):
+            with self._lock:
+                document = self._documents.get(doc_id)
+                if document is not None:
+                    document.refcount += 1
+                    return document
+            return self._load(doc_id)
+
+    def _load(self, doc_id: str) -> Optional[StoredDocument]:
+        # Caller holds the key lock
+        if self.persistence is None:
+            return None
+        stored = self.persistence.load_document(doc_id)
+        if stored is None:
+            return None
+        path, filename, chunks = stored
+        if not path.exists():
+            self.persistence.delete_document(doc_id)
+            return None
+        document = StoredDocument(doc_id=doc_id, path=path, filename=filename, chunks=chunks, refcount=1)
+        with self._lock:
+            self._documents[doc_id] = document
+        return document
+
+    def release(self, document: StoredDocument):
+        """Drop one reference; the last one unloads the document and deletes it if nothing persisted uses it."""
+        with self._lock:
+            document.refcount -= 1
+            if document.refcount > 0:
+                return
+            if self._documents.get(document.doc_id) is document:
+                del self._documents[document.doc_id]
+        self.collect(document.doc_id, document)
+
+    def collect(self, doc_id: str, document: Optional[StoredDocument] = None):
+        """Delete a document's file, collection and record unless something still references it."""
+        with self._key_lock(doc_id):
+            with self._lock:
+                if doc_id in self._documents:
+                    return
+            if self.persistence is not None:
+                if self.persistence.is_referenced(doc_id):
+                    return
+                if document is None:
+                    path = self.persistence.document_path(doc_id)
+                    if path is None:
+                        return
+                    document = StoredDocument(doc_id=doc_id, path=path, filename="", chunks=ChunkStore(doc_id))
+                self.persistence.delete_document(doc_id)
+            if document is not None:
+                document.close()
+        with self._lock:
+            self._key_locks.pop(doc_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "documents": len(self._documents),
+                "references": sum(document.refcount for document in self._documents.values()),
+                "chunks": sum(len(document.chunks) for document in self._documents.values()),
+                "dedupHits": self._hits,
+                "dedupHitRate": round(self._hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+document_store = DocumentStore(DOCUMENT_STORE_DIR, session_store)
+
+
+class SessionIndex:
+    """
+    Vector-store view over a session's documents. Embeds the query once,
+    searches every document collection and merges hits by distance.
+    """
+
+    def __init__(self, documents: List[StoredDocument], filenames: List[str]):
+        self.documents = list({document.doc_id: document for document in documents}.values())
+        # The same bytes may have been uploaded under another name first
+        self.filenames = {document.doc_id: filename for document, filename in zip(documents, filenames)}
+
+    def similarity_search(self, query: str, k: int = 4) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4):
+        embedding = get_embedding_service().embed_query(query)
+        scored = []
+        for document in self.documents:
+            store = document.ensure_index()
+            scored.extend(store.similarity_search_by_vector_with_relevance_scores(embedding, k=k))
+        scored.sort(key=lambda pair: pair[1])
+        return self._relabel(scored[:k])
+
+    def lexical_search(self, query: str, k: int = 4):
+        """BM25 matches across the session's documents, best first."""
+        scored = []
+        for document in self.documents:
+            # Index hits are views into the chunk store; results leave as Documents
+            scored.extend((chunk.to_document(), score) for chunk, score in document.ensure_lexical_index().search(query, k))
+        scored.sort(key=lambda pair: pair[1], reverse=True)
+        return self._relabel(scored[:k])
+
+    def _relabel(self, results):
+        for doc, _ in results:
+            doc_id = doc.metadata.get("doc_id")
+            if doc_id in self.filenames:
+                doc.metadata["source"] = self.filenames[doc_id]
+        return results
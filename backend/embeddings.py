@@ -0,0 +1,148 @@
+"""Process-wide embedding service shared by every session's vector store."""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+from backend.telemetry import STAGE_SECONDS
+
+
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 64))
+# How long the encoder waits for other sessions' requests before running a batch.
+EMBEDDING_BATCH_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", 5))
+
+
+class EmbeddingService(Embeddings):
+    """
+    Lazily loads one sentence-transformers model per worker and batches
+    concurrent encode requests onto a single background encoder thread.
+    """
+
+    def __init__(self, model_name: str, batch_size: int, batch_wait_ms: float):
+        self.model_name = model_name
+        self.batch_size = max(1, batch_size)
+        self.batch_wait = max(0.0, batch_wait_ms) / 1000
+        self._model = None
+        self._load_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._pending: List[Tuple[List[str], Future]] = []
+        self._worker: Optional[threading.Thread] = None
+        self._load_seconds: Optional[float] = None
+        self._texts_encoded = 0
+        self._batches = 0
+        self._encode_seconds = 0.0
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def load(self):
+        """Load the model if needed and return it."""
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    from langchain_huggingface import HuggingFaceEmbeddings
+
+                    start = time.perf_counter()
+                    self._model = HuggingFaceEmbeddings(
+                        model_name=self.model_name,
+                        model_kwargs={"device": "cpu"},
+                        encode_kwargs={"batch_size": self.batch_size},
+                    )
+                    self._load_seconds = time.perf_counter() - start
+                    print(f"Loaded embedding model {self.model_name} in {self._load_seconds:.2f}s")
+        return self._model
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._submit(list(texts))
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._submit([text])[0]
+
+    def _submit(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        future: Future = Future()
+        with self._cond:
+            self._pending.append((texts, future))
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="embedding-encoder", daemon=True)
+                self._worker.start()
+            self._cond.notify()
+        return future.result()
+
+    def _next_batch(self) -> List[Tuple[List[str], Future]]:
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+        # Give requests from other sessions a moment to join this batch.
+        if self.batch_wait:
+            time.sleep(self.batch_wait)
+        with self._cond:
+            batch = [self._pending.pop(0)]
+            size = len(batch[0][0])
+            while self._pending and size + len(self._pending[0][0]) <= self.batch_size:
+                request = self._pending.pop(0)
+                batch.append(request)
+                size += len(request[0])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                model = self.load()
+                texts = [text for request_texts, _ in batch for text in request_texts]
+                start = time.perf_counter()
+                vectors = model.embed_documents(texts)
+                elapsed = time.perf_counter() - start
+                STAGE_SECONDS.observe(elapsed, stage="embed")
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            with self._cond:
+                self._texts_encoded += len(texts)
+                self._batches += 1
+                self._encode_seconds += elapsed
+
+            offset = 0
+            for request_texts, future in batch:
+                future.set_result(vectors[offset:offset + len(request_texts)])
+                offset += len(request_texts)
+
+    def stats(self) -> dict:
+        with self._cond:
+            throughput = self._texts_encoded / self._encode_seconds if self._encode_seconds else 0.0
+            return {
+                "model": self.model_name,
+                "loaded": self.loaded,
+                "loadSeconds": self._load_seconds,
+                "textsEncoded": self._texts_encoded,
+                "batches": self._batches,
+                "encodeSeconds": round(self._encode_seconds, 4),
+                "textsPerSecond": round(throughput, 2),
+                "pendingRequests": len(self._pending),
+            }
+
+
+_service: Optional[EmbeddingService] = None
+_service_lock = threading.Lock()
+
+
+def get_embedding_service() -> EmbeddingService:
+    """Return the worker-wide embedding service, creating it on first use."""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = EmbeddingService(EMBEDDING_MODEL_NAME, EMBEDDING_BATCH_SIZE, EMBEDDING_BATCH_WAIT_MS)
+    return _service
@@ -0,0 +1,218 @@
+"""Rendered downloads of generated notes (DOCX, Markdown, PDF), cached on disk by content."""
+
+from __future__ import annotations
+
+import hashlib
+import html
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from backend.poc_app import ConsolidatedNotes
+from backend.telemetry import stage
+
+
+EXPORT_DIR = os.getenv("EXPORT_DIR", "./cache/exports")
+EXPORT_CACHE_MAX_MB = int(os.getenv("EXPORT_CACHE_MAX_MB", 256))
+# Part of every export's content hash; bump when a renderer's output changes
+RENDER_VERSION = 1
+
+PDF_PAGE_SIZE = "a4"
+PDF_MARGIN = 54
+
+
+def render_docx(notes: ConsolidatedNotes, path: Path):
+    # Deferred: python-docx is only needed once someone downloads notes
+    from docx import Document as DocxDocument
+    from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
+    from docx.shared import Pt
+
+    doc = DocxDocument()
+
+    title = doc.add_heading(notes.title, level=0)
+    title.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
+
+    doc.add_heading('Summary', level=1)
+    summary_para = doc.add_paragraph(notes.summary)
+    summary_para.paragraph_format.space_after = Pt(12)
+
+    doc.add_heading('Key Points', level=1)
+    for point in notes.key_points:
+        doc.add_paragraph(point, style='List Bullet')
+
+    doc.add_heading('Detailed Notes', level=1)
+    detailed_para = doc.add_paragraph(notes.detailed_notes)
+    detailed_para.paragraph_format.space_after = Pt(12)
+
+    doc.save(str(path))
+
+
+def render_markdown(notes: ConsolidatedNotes, path: Path):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"# {notes.title}\n\n## Summary\n\n{notes.summary}\n\n## Key Points\n\n")
+        for point in notes.key_points:
+            f.write(f"- {point}\n")
+        f.write(f"\n## Detailed Notes\n\n{notes.detailed_notes}\n")
+
+
+def _html_paragraphs(text: str) -> str:
+    paragraphs = [part.strip() for part in text.split("\n\n") if part.strip()]
+    return "".join(f"<p>{html.escape(paragraph).replace(chr(10), '<br/>')}</p>" for paragraph in paragraphs)
+
+
+def render_pdf(notes: ConsolidatedNotes, path: Path):
+    import fitz
+
+    body = (
+        f"<h1 style='text-align: center'>{html.escape(notes.title)}</h1>"
+        f"<h2>Summary</h2>{_html_paragraphs(notes.summary)}"
+        f"<h2>Key Points</h2><ul>{''.join(f'<li>{html.escape(point)}</li>' for point in notes.key_points)}</ul>"
+        f"<h2>Detailed Notes</h2>{_html_paragraphs(notes.detailed_notes)}"
+    )
+    story = fitz.Story(html=body)
+    page = fitz.paper_rect(PDF_PAGE_SIZE)
+    content = page + (PDF_MARGIN, PDF_MARGIN, -PDF_MARGIN, -PDF_MARGIN)
+    writer = fitz.DocumentWriter(str(path))
+    more = True
+    while more:
+        device = writer.begin_page(page)
+        more, _ = story.place(content)
+        story.draw(device)
+        writer.end_page()
+    writer.close()
+
+
+@dataclass(frozen=True)
+class ExportFormat:
+    extension: str
+    media_type: str
+    render: Callable[[ConsolidatedNotes, Path], None]
+
+
+FORMATS: Dict[str, ExportFormat] = {
+    "docx": ExportFormat(".docx", "application/vnd.openxmlformats-officedocument.wordprocessingml.document", render_docx),
+    "md": ExportFormat(".md", "text/markdown; charset=utf-8", render_markdown),
+    "pdf": ExportFormat(".pdf", "application/pdf", render_pdf),
+}
+
+
+@dataclass(frozen=True)
+class ExportFile:
+    path: Path
+    etag: str
+    media_type: str
+    filename: str
+
+
+def export_hash(notes: ConsolidatedNotes, fmt: str) -> str:
+    """Content address of one rendering: the notes, the format and the renderer version."""
+    digest = hashlib.sha256(f"{fmt}\0{RENDER_VERSION}\0".encode())
+    digest.update(notes.model_dump_json().encode())
+    return digest.hexdigest()
+
+
+def download_filename(notes: ConsolidatedNotes, fmt: str) -> str:
+    name = "_".join(notes.title.split()).strip("._") or "notes"
+    # Keep path separators and other reserved characters out of the suggested name
+    name = "".join(char for char in name if char not in '\\/:*?"<>|')
+    return f"{name[:100]}{FORMATS[fmt].extension}"
+
+
+class ExportCache:
+    """
+    Rendered exports on disk, named by content hash, so every session and
+    worker with the same notes shares one file. Files are written atomically
+    and the least recently used are removed once the directory exceeds max_bytes.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self._hits = 0
+        self._misses = 0
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def path(self, key: str, fmt: str) -> Path:
+        return self.directory / f"{key}{FORMATS[fmt].extension}"
+
+    def get(self, notes: ConsolidatedNotes, fmt: str) -> ExportFile:
+        """Return the rendered file for these notes, rendering it first if needed. Blocking: run on the worker pool."""
+        key = export_hash(notes, fmt)
+        path = self.path(key, fmt)
+        export = ExportFile(path=path, etag=f'"{key}"', media_type=FORMATS[fmt].media_type, filename=download_filename(notes, fmt))
+        if self._touch(path):
+            return export
+        # Concurrent downloads of the same notes render once
+        with self._key_lock(key):
+            if self._touch(path):
+                return export
+            self.directory.mkdir(parents=True, exist_ok=True)
+            partial = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            try:
+                with stage(f"export.{fmt}"):
+                    FORMATS[fmt].render(notes, partial)
+                # Another worker may finish the same file first; either copy is identical
+                os.replace(partial, path)
+            finally:
+                partial.unlink(missing_ok=True)
+            with self._lock:
+                self._misses += 1
+                self._key_locks.pop(key, None)
+        self._evict(keep=path)
+        return export
+
+    def _touch(self, path: Path) -> bool:
+        try:
+            # Marks the file as recently used for eviction
+            os.utime(path)
+        except FileNotFoundError:
+            return False
+        with self._lock:
+            self._hits += 1
+        return True
+
+    def _files(self):
+        files = []
+        for path in self.directory.glob("*"):
+            if path.suffix == ".tmp":
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def _evict(self, keep: Optional[Path] = None):
+        files = self._files()
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def stats(self) -> dict:
+        files = self._files() if self.directory.exists() else []
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "files": len(files),
+                "bytes": sum(size for _, size, _ in files),
+                "maxBytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hitRate": round(self._hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+export_cache = ExportCache(EXPORT_DIR, EXPORT_CACHE_MAX_MB * 1024 * 1024)
@@ -0,0 +1,91 @@
+"""Parallel PDF extraction: large documents are split into page ranges across processes."""
+
+from __future__ import annotations
+
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Deque, Iterator, Optional, Tuple
+
+from backend.file_handler.pdf_handler import count_pdf_pages, extract_pdf_pages, iter_pdf_pages
+
+
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", os.cpu_count() or 1))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", 25))
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        with _pool_lock:
+            if _process_pool is None:
+                # spawn, not fork: the parent has live threads (encoder, worker pool)
+                _process_pool = ProcessPoolExecutor(
+                    max_workers=EXTRACTION_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+    return _process_pool
+
+
+def iter_pdf_pages_parallel(pdf_path: str) -> Iterator[Tuple[int, str]]:
+    """
+    Same pages as iter_pdf_pages, but PDFs longer than PDF_PAGES_PER_TASK pages
+    are extracted as page ranges on the process pool. Ranges are yielded in
+    order as soon as each one is ready.
+    """
+    page_count = count_pdf_pages(pdf_path)
+    if EXTRACTION_WORKERS <= 1 or page_count <= PDF_PAGES_PER_TASK:
+        yield from iter_pdf_pages(pdf_path)
+        return
+
+    starts = iter(range(0, page_count, PDF_PAGES_PER_TASK))
+    pool: Optional[ProcessPoolExecutor] = _get_process_pool()
+    # Only EXTRACTION_WORKERS ranges run ahead of the consumer, so a huge PDF
+    # never has every range's text waiting in memory at once
+    pending: Deque[Tuple[int, Optional[Future]]] = deque()
+    try:
+        while True:
+            while pool is not None and len(pending) < EXTRACTION_WORKERS:
+                start = next(starts, None)
+                if start is None:
+                    break
+                pending.append((start, pool.submit(extract_pdf_pages, pdf_path, start, start + PDF_PAGES_PER_TASK)))
+            if pending:
+                start, future = pending.popleft()
+            else:
+                start = next(starts, None)
+                if start is None:
+                    return
+                future = None
+            pages = None
+            if future is not None:
+                try:
+                    pages = future.result()
+                except BrokenProcessPool as e:
+                    # A crashed worker poisons the pool; finish serially and start a fresh pool next time
+                    print(f"PDF extraction pool failed, extracting serially: {e}")
+                    shutdown_extraction_pool()
+                    pool = None
+                    pending = deque((start, None) for start, _ in pending)
+            if pages is None:
+                yield from iter_pdf_pages(pdf_path, start, start + PDF_PAGES_PER_TASK)
+            else:
+                yield from pages
+    finally:
+        # The consumer stopped early: drop ranges nobody will read
+        for _, future in pending:
+            if future is not None:
+                future.cancel()
+
+def shutdown_extraction_pool():
+    global _process_pool
+    with _pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown(cancel_futures=True)
+            _process_pool = None
@@ -1,18 +1,22 @@
 from docx import Document
 
-# New optimised code
-def extract_docx_text(docx_path):
-    """Extract text from DOCX"""
+def iter_docx_segments(docx_path):
+    """Yield the non-empty paragraphs of a DOCX, then its table rows"""
     doc = Document(docx_path)
-    all_text = []
-    # Extract regular text
-    full_text = [p.text for p in doc.paragraphs if p.text.strip()]
-    # Extract text from tables
+    for p in doc.paragraphs:
+        if p.text.strip():
+            yield p.text
     for table in doc.tables:
         for row in table.rows:
             row_text = [cell.text.strip() for cell in row.cells if cell.text.strip()]
             if row_text:
-                full_text.append(' | '.join(row_text))
+                yield ' | '.join(row_text)
+
+# New optimised code
+def extract_docx_text(docx_path):
+    """Extract text from DOCX"""
+    all_text = []
+    full_text = list(iter_docx_segments(docx_path))
     if full_text:
         all_text.append("Document Text:\n" + '\n'.join(full_text))
     return '\n\n'.join(all_text)
\ No newline at end of file
@@ -1,13 +1,27 @@
-import fitz
+def _open_pdf(pdf_path):
+    # Deferred: PyMuPDF is slow to import and only needed once a PDF arrives
+    import fitz
+    return fitz.open(pdf_path)
+
+def count_pdf_pages(pdf_path):
+    """Number of pages in a PDF"""
+    with _open_pdf(pdf_path) as doc:
+        return len(doc)
+
+def iter_pdf_pages(pdf_path, start=0, stop=None):
+    """Yield (page_number, text) for every non-empty PDF page in [start, stop), one page at a time"""
+    with _open_pdf(pdf_path) as doc:
+        stop = len(doc) if stop is None else min(stop, len(doc))
+        for page_num in range(start, stop):
+            page_text = doc[page_num].get_text()
+            if page_text.strip():
+                yield page_num + 1, page_text
+
+def extract_pdf_pages(pdf_path, start=0, stop=None):
+    """Extract (page_number, text) pairs for every non-empty PDF page in [start, stop)"""
+    return list(iter_pdf_pages(pdf_path, start, stop))
 
 def extract_pdf_text(pdf_path):
     """Extract text from PDF"""
-    doc = fitz.open(pdf_path)
-    all_text = []    
-    for page_num in range(len(doc)):
-        page = doc[page_num]
-        page_text = page.get_text()
-        if page_text.strip():
-            all_text.append(f"Page {page_num + 1}:\n{page_text}")
-    doc.close()
+    all_text = [f"Page {page_num}:\n{page_text}" for page_num, page_text in iter_pdf_pages(pdf_path)]
     return '\n\n'.join(all_text)
\ No newline at end of file
@@ -1,14 +1,30 @@
+import codecs
+
+TXT_SEGMENT_CHARS = 64 * 1024
+
+def detect_txt_encoding(file):
+    """Return 'utf-8' if the whole file decodes as UTF-8, else 'latin-1'"""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    try:
+        with open(file, 'rb') as f:
+            for block in iter(lambda: f.read(TXT_SEGMENT_CHARS), b''):
+                decoder.decode(block)
+            decoder.decode(b'', final=True)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return 'latin-1'
+
+def iter_txt_segments(file, segment_chars=TXT_SEGMENT_CHARS):
+    """Yield a TXT file's content in blocks of up to segment_chars characters"""
+    encoding = detect_txt_encoding(file)
+    with open(file, 'r', encoding=encoding) as f:
+        for block in iter(lambda: f.read(segment_chars), ''):
+            yield block
+
 def extract_txt_text(file):
     """Extract text from TXT file"""
     try:
-        with open(file, 'r', encoding='utf-8') as file:
-            content = file.read()
-        return content.strip()
-    except UnicodeDecodeError:
-        # Try with different encoding if utf-8 fails
-        with open(file, 'r', encoding='latin-1') as file:
-            content = file.read()
-        return [content.strip()] if content.strip() else []
+        return ''.join(iter_txt_segments(file)).strip()
     except Exception as e:
         print(f"Error reading text file: {e}")
         return ""
\ No newline at end of file
@@ -0,0 +1,254 @@
+"""In-process background jobs with progress, partial results and optional SQLite persistence."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional
+from uuid import uuid4
+
+from backend.concurrency import run_io, submit_io
+
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 4))
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", 60 * 60))
+# Empty keeps jobs in memory only
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", "./cache/jobs.sqlite3")
+# How often a subscriber re-reads a job that another worker is running
+JOB_POLL_INTERVAL_SECONDS = float(os.getenv("JOB_POLL_INTERVAL_SECONDS", 1.0))
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+FINISHED = {SUCCEEDED, FAILED}
+
+
+@dataclass
+class Job:
+    id: str
+    key: str
+    kind: str
+    status: str = QUEUED
+    progress: float = 0.0
+    message: str = ""
+    partial: dict = field(default_factory=dict)
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+    revision: int = 0
+
+    def snapshot(self) -> dict:
+        return {
+            "jobId": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": round(self.progress, 4),
+            "message": self.message,
+            "partial": self.partial,
+            "result": self.result,
+            "error": self.error,
+            "createdAt": self.created_at,
+            "updatedAt": self.updated_at,
+        }
+
+
+class SQLiteJobStore:
+    """Keeps the latest state of every job so polling survives restarts and other workers."""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, key TEXT NOT NULL, "
+                "state TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_key ON jobs(key)")
+            self._conn.commit()
+        return self._conn
+
+    def save(self, job_id: str, key: str, state: str, updated_at: float):
+        with self._lock:
+            conn = self._connect()
+            # Writes run on the pool and may land out of order; never replace newer state
+            conn.execute(
+                "INSERT INTO jobs (id, key, state, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET state = excluded.state, updated_at = excluded.updated_at "
+                "WHERE excluded.updated_at >= jobs.updated_at",
+                (job_id, key, state, updated_at),
+            )
+            conn.commit()
+
+    def load(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            row = self._connect().execute("SELECT state FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return Job(**json.loads(row[0])) if row else None
+
+    def prune(self, older_than: float):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM jobs WHERE updated_at < ?", (older_than,))
+            conn.commit()
+
+
+class JobContext:
+    """Handle given to a running job for reporting progress and partial results."""
+
+    def __init__(self, manager: "JobManager", job: Job):
+        self._manager = manager
+        self._job = job
+
+    @property
+    def partial(self) -> dict:
+        return self._job.partial
+
+    def report(self, progress: float, message: str = "", partial: Optional[dict] = None):
+        self._job.progress = min(1.0, max(0.0, progress))
+        if message:
+            self._job.message = message
+        if partial:
+            self._job.partial.update(partial)
+        self._manager._changed(self._job)
+
+
+class JobManager:
+    """
+    Runs async jobs with at most `workers` in flight. Submitting a key that
+    already has a queued, running or retained successful job returns that job.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, retention_seconds: int = JOB_RETENTION_SECONDS,
+                 store: Optional[SQLiteJobStore] = None):
+        self.workers = workers
+        self.retention_seconds = retention_seconds
+        self.store = store
+        self._jobs: Dict[str, Job] = {}
+        self._by_key: Dict[str, str] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._conditions: Dict[str, asyncio.Condition] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._deduplicated = 0
+
+    def submit(self, key: str, kind: str, run: Callable[[JobContext], Awaitable[dict]]) -> Job:
+        self._prune()
+        existing = self._jobs.get(self._by_key.get(key, ""))
+        if existing is not None and existing.status != FAILED:
+            self._deduplicated += 1
+            return existing
+
+        job = Job(id=str(uuid4()), key=key, kind=kind)
+        self._jobs[job.id] = job
+        self._by_key[key] = job.id
+        self._tasks[job.id] = asyncio.create_task(self._run(job, run))
+        self._changed(job)
+        return job
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        job = self._jobs.get(job_id)
+        if job is None and self.store is not None:
+            job = await run_io(self.store.load, job_id)
+            if job is not None and job.status not in FINISHED and time.time() - job.updated_at > self.retention_seconds:
+                # Owned by a worker that stopped before finishing it
+                job.status = FAILED
+                job.error = "Job was interrupted."
+        return job
+
+    async def subscribe(self, job_id: str) -> AsyncIterator[dict]:
+        """
+        Yield a snapshot now and after every change until the job finishes.
+        Jobs run by another worker (or one that restarted) are followed by
+        polling the store.
+        """
+        job = await self.get(job_id)
+        if job is None:
+            return
+        yield job.snapshot()
+        if job_id not in self._jobs:
+            while job.status not in FINISHED:
+                await asyncio.sleep(JOB_POLL_INTERVAL_SECONDS)
+                seen = job.revision
+                job = await self.get(job_id)
+                if job is None:
+                    # Pruned before we saw it finish
+                    return
+                if job.revision != seen or job.status in FINISHED:
+                    yield job.snapshot()
+            return
+        condition = self._condition(job_id)
+        while job.status not in FINISHED:
+            seen = job.revision
+            async with condition:
+                await condition.wait_for(lambda: job.revision != seen)
+            yield job.snapshot()
+
+    def stats(self) -> dict:
+        statuses: Dict[str, int] = {}
+        for job in self._jobs.values():
+            statuses[job.status] = statuses.get(job.status, 0) + 1
+        return {"workers": self.workers, "jobs": statuses, "deduplicated": self._deduplicated}
+
+    def shutdown(self):
+        for task in list(self._tasks.values()):
+            task.cancel()
+
+    def _condition(self, job_id: str) -> asyncio.Condition:
+        return self._conditions.setdefault(job_id, asyncio.Condition())
+
+    async def _run(self, job: Job, run: Callable[[JobContext], Awaitable[dict]]):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.workers)
+        async with self._semaphore:
+            job.status = RUNNING
+            self._changed(job)
+            try:
+                job.result = await run(JobContext(self, job))
+                job.status = SUCCEEDED
+                job.progress = 1.0
+            except Exception as e:
+                print(f"Job {job.id} failed: {e}")
+                job.status = FAILED
+                job.error = str(e) or e.__class__.__name__
+            finally:
+                self._tasks.pop(job.id, None)
+                self._changed(job)
+
+    def _changed(self, job: Job):
+        job.updated_at = time.time()
+        job.revision += 1
+        if self.store is not None:
+            submit_io(self.store.save, job.id, job.key, json.dumps(asdict(job)), job.updated_at)
+        condition = self._conditions.get(job.id)
+        if condition is not None:
+            asyncio.create_task(self._notify(condition))
+
+    @staticmethod
+    async def _notify(condition: asyncio.Condition):
+        async with condition:
+            condition.notify_all()
+
+    def _prune(self):
+        cutoff = time.time() - self.retention_seconds
+        for job_id, job in list(self._jobs.items()):
+            if job.status in FINISHED and job.updated_at < cutoff:
+                del self._jobs[job_id]
+                self._conditions.pop(job_id, None)
+                if self._by_key.get(job.key) == job_id:
+                    del self._by_key[job.key]
+        if self.store is not None:
+            submit_io(self.store.prune, cutoff)
+
+
+job_manager = JobManager(store=SQLiteJobStore(JOB_STORE_PATH) if JOB_STORE_PATH else None)
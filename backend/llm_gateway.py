@@ -0,0 +1,372 @@
+"""Shared gateway for LLM calls: rate limits, coalescing, retries, circuit breaking and latency metrics."""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Tuple
+
+from backend.concurrency import llm_slot
+from backend.prompting import estimate_tokens
+from backend.telemetry import LLM_ERRORS, LLM_PROMPT_TOKENS, LLM_SECONDS, LLM_TOKENS, span
+
+
+# Provider limits per model; 0 disables the limit. Defaults match Groq's free tier for llama-3.1-8b-instant
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", 30))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", 6000))
+# Completion tokens reserved per call on top of the prompt until the real usage is known
+LLM_COMPLETION_TOKENS = int(os.getenv("LLM_COMPLETION_TOKENS", 512))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 3))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", 0.5))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", 20))
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", 5))
+LLM_BREAKER_COOLDOWN_SECONDS = float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", 30))
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+LATENCY_WINDOW = 512
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised without calling the provider while a model's circuit breaker is open."""
+
+
+def is_retryable(error: Exception) -> bool:
+    """Rate limits, server errors, timeouts and dropped connections are worth retrying."""
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    if isinstance(error, (TimeoutError, ConnectionError, asyncio.TimeoutError)):
+        return True
+    # groq.APIConnectionError / APITimeoutError carry no status code
+    return type(error).__name__ in {"APIConnectionError", "APITimeoutError"}
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, error: Exception) -> float:
+    """Full-jitter exponential backoff, never shorter than the provider's Retry-After."""
+    delay = random.uniform(0, min(LLM_BACKOFF_MAX_SECONDS, LLM_BACKOFF_BASE_SECONDS * 2 ** attempt))
+    return max(delay, retry_after(error) or 0.0)
+
+
+class TokenBucket:
+    """
+    Reservation-based token bucket holding one minute of capacity. reserve()
+    takes the amount immediately and returns how long the caller must wait
+    before using it, so concurrent callers queue up in order.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.level = per_minute
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            self._refill()
+            self.level -= min(amount, self.capacity)
+            return 0.0 if self.level >= 0 else -self.level / self.rate
+
+    def adjust(self, amount: float):
+        """Give back (positive) or take more (negative) once the real cost is known."""
+        if self.rate <= 0:
+            return
+        with self._lock:
+            self._refill()
+            self.level = min(self.capacity, self.level + amount)
+
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive transient failures; one trial call is let through after the cooldown."""
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def admit(self) -> Optional[bool]:
+        """
+        None if the call is rejected, otherwise whether it is the half-open
+        trial. The trial must end in record_success, record_failure or
+        release_trial, or no further call is let through.
+        """
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return False
+            if state == "half-open" and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            return None
+
+    def release_trial(self):
+        """End a trial call that was abandoned (e.g. cancelled) before it had an outcome."""
+        with self._lock:
+            self.trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+class ModelState:
+    """Limits, breaker and metrics shared by every gateway calling the same model."""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.requests = TokenBucket(LLM_REQUESTS_PER_MINUTE)
+        self.tokens = TokenBucket(LLM_TOKENS_PER_MINUTE)
+        self.breaker = CircuitBreaker(LLM_BREAKER_THRESHOLD, LLM_BREAKER_COOLDOWN_SECONDS)
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.counters = {"calls": 0, "failures": 0, "retries": 0, "coalesced": 0, "rejected": 0}
+        self.throttled_seconds = 0.0
+
+    def stats(self) -> dict:
+        latencies = sorted(self.latencies)
+
+        def percentile(p: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 1)
+
+        return {
+            **self.counters,
+            "breaker": self.breaker.state,
+            "throttledSeconds": round(self.throttled_seconds, 3),
+            "latencyP50Ms": percentile(0.5),
+            "latencyP95Ms": percentile(0.95),
+            "latencyP99Ms": percentile(0.99),
+        }
+
+
+_models: Dict[str, ModelState] = {}
+_models_lock = threading.Lock()
+
+
+def model_state(model: str) -> ModelState:
+    with _models_lock:
+        if model not in _models:
+            _models[model] = ModelState(model)
+        return _models[model]
+
+
+def gateway_stats() -> dict:
+    return {model: state.stats() for model, state in list(_models.items())}
+
+
+class LLMGateway:
+    """
+    Wraps a LangChain chat model (or a runnable built on one, e.g. structured
+    output) with the model's shared rate limits, retry/backoff and circuit
+    breaker. Identical prompts in flight on the same gateway share one call.
+    The client is built by `factory` on first use.
+    """
+
+    def __init__(self, factory: Callable[[], Any], model: str, name: str):
+        self.factory = factory
+        self.model = model
+        self.name = name
+        self.state = model_state(model)
+        self._client = None
+        self._client_lock = threading.Lock()
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    @property
+    def loaded(self) -> bool:
+        return self._client is not None
+
+    @property
+    def client(self) -> Any:
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self.factory()
+        return self._client
+
+    def _admit(self, prompt: str) -> Tuple[float, int, bool]:
+        """
+        Check the breaker and reserve rate-limit capacity; returns (wait
+        seconds, tokens reserved, whether this is the breaker's trial call).
+        """
+        trial = self.state.breaker.admit()
+        if trial is None:
+            self.state.counters["rejected"] += 1
+            raise CircuitOpenError(f"LLM circuit for {self.model} is open; try again shortly.")
+        prompt_tokens = estimate_tokens(prompt)
+        LLM_PROMPT_TOKENS.observe(prompt_tokens, gateway=self.name)
+        reserved = prompt_tokens + LLM_COMPLETION_TOKENS
+        wait = max(self.state.requests.reserve(1), self.state.tokens.reserve(reserved))
+        self.state.throttled_seconds += wait
+        return wait, reserved, trial
+
+    def _succeeded(self, started: float):
+        elapsed = time.perf_counter() - started
+        self.state.latencies.append(elapsed)
+        LLM_SECONDS.observe(elapsed, gateway=self.name, model=self.model)
+
+    def _settle(self, result: Any, reserved: int):
+        usage = getattr(result, "usage_metadata", None) or {}
+        if usage.get("total_tokens"):
+            self.state.tokens.adjust(reserved - usage["total_tokens"])
+        for kind, key in (("prompt", "input_tokens"), ("completion", "output_tokens")):
+            if usage.get(key):
+                LLM_TOKENS.inc(usage[key], gateway=self.name, type=kind)
+
+    def _failed(self, error: Exception, attempt: int, trial: bool) -> bool:
+        """
+        Record a failed attempt; returns True if it should be retried. The
+        breaker's half-open trial is never retried: its failure re-opens the
+        circuit, which also frees the trial slot for the next cooldown.
+        """
+        LLM_ERRORS.inc(gateway=self.name, error=error.__class__.__name__)
+        transient = is_retryable(error)
+        if transient and attempt < LLM_MAX_RETRIES and not trial:
+            self.state.counters["retries"] += 1
+            return True
+        self.state.counters["failures"] += 1
+        if transient:
+            self.state.breaker.record_failure()
+        else:
+            # The provider answered; a bad request says nothing about its health
+            self.state.breaker.record_success()
+        return False
+
+    def _abandoned(self, trial: bool):
+        """An attempt ended without an outcome (cancelled, client gone): free the breaker's trial slot."""
+        if trial:
+            self.state.breaker.release_trial()
+
+    def invoke(self, prompt: str) -> Any:
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            wait, reserved, trial = self._admit(prompt)
+            try:
+                if wait:
+                    time.sleep(wait)
+                started = time.perf_counter()
+                self.state.counters["calls"] += 1
+                with span("llm", gateway=self.name, model=self.model, attempt=attempt):
+                    result = self.client.invoke(prompt)
+            except Exception as e:
+                if not self._failed(e, attempt, trial):
+                    raise
+                time.sleep(backoff_delay(attempt, e))
+                continue
+            except BaseException:
+                self._abandoned(trial)
+                raise
+            self._succeeded(started)
+            self.state.breaker.record_success()
+            self._settle(result, reserved)
+            return result
+
+    async def _ainvoke(self, prompt: str) -> Any:
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            wait, reserved, trial = self._admit(prompt)
+            try:
+                if wait:
+                    await asyncio.sleep(wait)
+                async with llm_slot():
+                    started = time.perf_counter()
+                    self.state.counters["calls"] += 1
+                    with span("llm", gateway=self.name, model=self.model, attempt=attempt):
+                        result = await self.client.ainvoke(prompt)
+            except Exception as e:
+                if not self._failed(e, attempt, trial):
+                    raise
+                delay = backoff_delay(attempt, e)
+            except BaseException:
+                self._abandoned(trial)
+                raise
+            else:
+                self._succeeded(started)
+                self.state.breaker.record_success()
+                self._settle(result, reserved)
+                return result
+            await asyncio.sleep(delay)
+
+    async def ainvoke(self, prompt: str) -> Any:
+        task = self._inflight.get(prompt)
+        if task is None:
+            task = asyncio.create_task(self._ainvoke(prompt))
+            self._inflight[prompt] = task
+            task.add_done_callback(lambda _: self._inflight.pop(prompt, None))
+        else:
+            self.state.counters["coalesced"] += 1
+        # One caller giving up must not cancel the call for the others
+        return await asyncio.shield(task)
+
+    async def astream(self, prompt: str) -> AsyncIterator[Any]:
+        """Stream chunks; a failure is only retried if nothing has been yielded yet."""
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            wait, reserved, trial = self._admit(prompt)
+            yielded = False
+            try:
+                if wait:
+                    await asyncio.sleep(wait)
+                async with llm_slot():
+                    started = time.perf_counter()
+                    self.state.counters["calls"] += 1
+                    async for chunk in self.client.astream(prompt):
+                        if not yielded:
+                            # Time to first token is what a streaming client waits for
+                            self._succeeded(started)
+                            yielded = True
+                        yield chunk
+            except Exception as e:
+                if yielded or not self._failed(e, attempt, trial):
+                    if yielded:
+                        self.state.counters["failures"] += 1
+                        LLM_ERRORS.inc(gateway=self.name, error=e.__class__.__name__)
+                        self._abandoned(trial)
+                    raise
+                delay = backoff_delay(attempt, e)
+            except BaseException:
+                # The client went away (GeneratorExit, CancelledError); tokens already
+                # arriving show the provider is healthy, otherwise the trial is simply freed
+                if yielded:
+                    self.state.breaker.record_success()
+                else:
+                    self._abandoned(trial)
+                raise
+            else:
+                self.state.breaker.record_success()
+                return
+            await asyncio.sleep(delay)
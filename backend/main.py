@@ -1,25 +1,49 @@
 from __future__ import annotations
 
+# First, so startup timing covers every import below
+from backend.warmup import startup_state
+
 import os
-import tempfile
-from dataclasses import dataclass
+import asyncio
+import time
+import traceback
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Literal, Optional, Tuple
 from uuid import uuid4
 
-from fastapi import FastAPI, File, HTTPException, UploadFile, Request
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
-from langchain.schema import Document
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
+from langchain_core.documents import Document
 from pydantic import BaseModel
 import uvicorn
-from docx import Document as DocxDocument
-from docx.shared import Pt, RGBColor
-from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
-import io
+import json
 
-from backend.poc_app import create_chunks, create_vector_db, generate_flashcards, generate_notes, generate_quiz, answer_question
+from backend.poc_app import (
+    ANSWER_ERROR_MESSAGE, LLM_MODEL, NOTES_ERROR, ConsolidatedNotes, FlashcardList, QuizList,
+    normalize_difficulty,
+    aanswer_question, arewrite_question, astream_answer,
+)
+from backend.answer_cache import answer_cache, content_key
+from backend.concurrency import pool_stats, run_in_pool, run_io
+from backend.conversation import get_conversation, record_turn
+from backend.embeddings import get_embedding_service
+from backend.documents import StoredDocument, document_store
+from backend.exports import export_cache
+from backend.extraction import shutdown_extraction_pool
+from backend.mapreduce import (
+    strategy_params,
+    agenerate_flashcards_for_chunks, agenerate_notes_for_chunks, agenerate_quiz_for_chunks,
+)
+from backend.sessions import SessionChangedError, SessionEntry, SessionManager
+from backend.result_cache import cache_key, get_or_generate, result_cache
+from backend.jobs import JobContext, job_manager
+from backend.llm_gateway import gateway_stats
+from backend.retrieval import retrieval_stats
+from backend.telemetry import HTTP_REQUESTS, HTTP_SECONDS, UNHANDLED_ERRORS, gauge, render_metrics, span
+from backend.uploads import MAX_UPLOAD_REQUEST_BYTES, UPLOAD_REQUEST_BODY, read_uploads
 
 
 ALLOWED_EXTENSIONS = {".pdf", ".docx", ".txt", ".csv", ".jpg", ".jpeg", ".png"}
@@ -28,6 +52,8 @@ ALLOWED_EXTENSIONS = {".pdf", ".docx", ".txt", ".csv", ".jpg", ".jpeg", ".png"}
 class FileInfo(BaseModel):
     filename: str
     chunkCount: int
+    # Content hash; identifies the file when removing it from a session
+    documentId: str
 
 class UploadResponse(BaseModel):
     fileId: str
@@ -50,17 +76,62 @@ class GenerateResponse(BaseModel):
     cards: List[FlashcardDTO]
 
 
-@dataclass
-class SessionEntry:
-    file_paths: List[Path]
-    chunks: List[Document]
-    filenames: List[str]
-    vector_store: any = None
+def flashcards_response(flashcards: FlashcardList) -> GenerateResponse:
+    return GenerateResponse(cards=[FlashcardDTO(q=card.q, a=card.a) for card in flashcards.cards])
+
+
+sessions = SessionManager()
+
+
+def build_session_index(entry: SessionEntry):
+    """
+    Make sure every document in the session is embedded and return the session's index.
+    Documents shared with other sessions are only embedded once.
+    """
+    if entry.closed:
+        raise HTTPException(status_code=404, detail="Upload session not found.")
+    for document in entry.documents:
+        document.ensure_index()
+    return entry.vector_store
+
+
+async def index_session_in_background(entry: SessionEntry):
+    try:
+        await run_in_pool(build_session_index, entry)
+    except Exception as e:
+        print(f"Error indexing session: {e}")
+
 
+SESSION_SWEEP_INTERVAL_SECONDS = 60
 
-sessions: Dict[str, SessionEntry] = {}
 
-app = FastAPI(title="Flashcard Generator API")
+async def sweep_expired_sessions():
+    while True:
+        await asyncio.sleep(SESSION_SWEEP_INTERVAL_SECONDS)
+        sessions.evict_expired()
+        try:
+            await run_io(sessions.purge_persisted)
+        except Exception as e:
+            print(f"Error purging expired sessions: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    sweeper = asyncio.create_task(sweep_expired_sessions())
+    warmup = None
+    if startup_state.warmup == "pending":
+        # Load heavy components after the server is accepting requests
+        warmup = asyncio.create_task(run_in_pool(startup_state.warm_up))
+    startup_state.started()
+    yield
+    sweeper.cancel()
+    if warmup is not None:
+        warmup.cancel()
+    job_manager.shutdown()
+    shutdown_extraction_pool()
+
+
+app = FastAPI(title="Flashcard Generator API", lifespan=lifespan)
 
 # CORS configuration - allow all origins for Hugging Face Spaces deployment
 app.add_middleware(
@@ -72,11 +143,88 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    """
+    Reject oversized uploads from their Content-Length before the body is parsed.
+    """
+    path = request.url.path
+    if path == "/api/upload" or (request.method == "POST" and path.startswith("/api/sessions/")):
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > MAX_UPLOAD_REQUEST_BYTES:
+            return PlainTextResponse(
+                f"Upload exceeds the {MAX_UPLOAD_REQUEST_BYTES // (1024 * 1024)} MB request limit.",
+                status_code=413,
+            )
+    return await call_next(request)
+
+
+def route_template(request: Request) -> str:
+    """The matched route's path template, so metrics don't get a series per file or job id."""
+    route = request.scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+@app.middleware("http")
+async def instrument_requests(request: Request, call_next):
+    """
+    Count and time every request by route and status. Streaming responses are
+    timed until their headers are sent.
+    """
+    started = time.perf_counter()
+    status = 500
+    try:
+        with span(f"{request.method} {request.url.path}", method=request.method):
+            response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = route_template(request)
+        HTTP_REQUESTS.inc(method=request.method, route=route, status=str(status))
+        HTTP_SECONDS.observe(time.perf_counter() - started, method=request.method, route=route)
+
+
 @app.get("/api/health")
 def health_check():
     return {"status": "ok"}
 
 
+@app.get("/api/ready")
+def readiness_check():
+    """
+    Which lazily loaded components are loaded, and startup/warm-up timings.
+    503 while the startup warm-up is still running.
+    """
+    report = startup_state.report()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+
+@app.get("/api/stats")
+def stats():
+    return {"embeddings": get_embedding_service().stats(), "pools": pool_stats(), "sessions": sessions.stats(), "resultCache": result_cache.stats(), "documents": document_store.stats(), "jobs": job_manager.stats(), "llm": gateway_stats(), "retrieval": retrieval_stats(), "answerCache": answer_cache.stats(), "exports": export_cache.stats()}
+
+
+gauge("live_sessions", "Upload sessions held in this worker.", lambda: len(sessions))
+gauge("session_memory_bytes", "Chunk text held by this worker's live sessions.", lambda: sessions.stats()["memoryBytes"])
+gauge("embedding_pending_requests", "Encode requests waiting for the embedding model.", lambda: get_embedding_service().stats()["pendingRequests"])
+gauge("jobs", "Background jobs known to this worker, by status.", lambda: job_manager.stats()["jobs"], ("status",))
+gauge(
+    "llm_breaker_open", "1 while a model's circuit breaker rejects calls.",
+    lambda: {model: int(state["breaker"] == "open") for model, state in gateway_stats().items()}, ("model",),
+)
+
+
+@app.get("/api/metrics")
+def metrics():
+    """
+    Prometheus text exposition of this worker's metrics: per-route request
+    counts and latency, stage timings (extraction, chunking, embedding,
+    vector-store writes and retrieval), LLM latency, prompt sizes, tokens
+    and errors, and JSON parse failures.
+    """
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
     """
@@ -91,92 +239,178 @@ async def http_exception_handler(request: Request, exc: HTTPException):
 @app.exception_handler(Exception)
 async def unhandled_exception_handler(request: Request, exc: Exception):
     """
-    Fallback handler to return plain-text error messages for unexpected errors.
+    Fallback handler for unexpected errors: logs the traceback under an error id
+    and returns that id in a plain-text message, so reports can be matched to logs.
     """
-    return PlainTextResponse("An unexpected error occurred while processing your request.", status_code=500)
+    error_id = uuid4().hex[:12]
+    UNHANDLED_ERRORS.inc(route=route_template(request), error=exc.__class__.__name__)
+    print(f"Unhandled error {error_id} in {request.method} {request.url.path}:")
+    # The cause chain only repeats these frames through the middleware task groups
+    traceback.print_exception(type(exc), exc, exc.__traceback__, chain=False)
+    return PlainTextResponse(
+        f"An unexpected error occurred while processing your request (error id {error_id}).", status_code=500
+    )
 
 
-@app.post("/api/upload", response_model=UploadResponse)
-async def upload_files(files: List[UploadFile] = File(...)):
-    if not files:
-        raise HTTPException(status_code=400, detail="At least one file is required.")
-    
-    all_chunks = []
-    saved_paths = []
-    file_infos = []
-    filenames = []
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def notes_for_text(text: str, chunks: List[Document]) -> ConsolidatedNotes:
+    return await get_or_generate(
+        "notes", text, strategy_params("notes", text), LLM_MODEL, ConsolidatedNotes,
+        lambda: agenerate_notes_for_chunks(text, chunks),
+        cacheable=lambda notes: notes != NOTES_ERROR,
+    )
+
+
+async def flashcards_for_text(text: str, chunks: List[Document], num_cards: int, difficulty: str) -> FlashcardList:
+    difficulty = normalize_difficulty(difficulty)
+
+    async def generate():
+        return FlashcardList(cards=await agenerate_flashcards_for_chunks(text, chunks, num_cards, difficulty))
+
+    return await get_or_generate(
+        "flashcards", text, {"numCards": num_cards, "difficulty": difficulty, **strategy_params("flashcards", text)}, LLM_MODEL, FlashcardList,
+        generate,
+        cacheable=lambda flashcards: bool(flashcards.cards),
+    )
+
+
+async def quiz_for_text(text: str, chunks: List[Document], num_questions: int, difficulty: str) -> QuizList:
+    difficulty = normalize_difficulty(difficulty)
+    return await get_or_generate(
+        "quiz", text, {"numQuestions": num_questions, "difficulty": difficulty, **strategy_params("quiz", text)}, LLM_MODEL, QuizList,
+        lambda: agenerate_quiz_for_chunks(text, chunks, num_questions, difficulty),
+        cacheable=lambda quiz: bool(quiz.questions),
+    )
+
+
+async def ingest_uploads(request: Request) -> List[Tuple[StoredDocument, str]]:
+    """
+    Stream the request's uploaded files to disk, then ingest them, returning
+    (document, filename) pairs that each hold one document reference.
+    Nothing is kept if any file fails.
+    """
+    received = await read_uploads(request, allowed_suffixes=ALLOWED_EXTENSIONS)
+    empty = next((filename for _, _, filename, size in received if not size), None)
+    if not received or empty is not None:
+        for saved_path, _, _, _ in received:
+            saved_path.unlink(missing_ok=True)
+        if not received:
+            raise HTTPException(status_code=400, detail="At least one file is required.")
+        raise HTTPException(status_code=400, detail=f"File is empty: {empty}")
+    saved = [(saved_path, digest, filename) for saved_path, digest, filename, _ in received]
     
-    for file in files:
-        if not file.filename:
-            # Clean up already saved files
-            for path in saved_paths:
-                if path.exists():
-                    path.unlink()
-            raise HTTPException(status_code=400, detail="All files must have filenames.")
-        
-        suffix = Path(file.filename).suffix.lower()
-        if suffix not in ALLOWED_EXTENSIONS:
-            # Clean up already saved files
-            for path in saved_paths:
-                if path.exists():
-                    path.unlink()
-            raise HTTPException(status_code=400, detail=f"Unsupported file type: {file.filename}")
-        
-        file_bytes = await file.read()
-        if not file_bytes:
-            # Clean up already saved files
-            for path in saved_paths:
-                if path.exists():
-                    path.unlink()
-            raise HTTPException(status_code=400, detail=f"File is empty: {file.filename}")
-        
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-            tmp.write(file_bytes)
-            saved_path = Path(tmp.name)
-        
-        chunks = create_chunks(saved_path)
-        if not chunks:
-            # Clean up this file and all previously saved files
-            if saved_path.exists():
-                saved_path.unlink()
-            for path in saved_paths:
-                if path.exists():
-                    path.unlink()
-            raise HTTPException(status_code=422, detail=f"Unable to extract text from file: {file.filename}")
-        
-        saved_paths.append(saved_path)
-        all_chunks.extend(chunks)
-        filenames.append(file.filename)
-        file_infos.append(FileInfo(filename=file.filename, chunkCount=len(chunks)))
+    # Extract all files concurrently. Known content is reused as-is; new content
+    # is stored, chunked and registered.
+    results = await asyncio.gather(
+        *(run_in_pool(document_store.ingest, saved_path, filename, digest) for saved_path, digest, filename in saved),
+        return_exceptions=True,
+    )
+    documents = [result for result in results if result is not None and not isinstance(result, BaseException)]
+    for result, (saved_path, _, filename) in zip(results, saved):
+        if result is None or isinstance(result, BaseException):
+            for document in documents:
+                document_store.release(document)
+            saved_path.unlink(missing_ok=True)
+            if isinstance(result, BaseException):
+                raise result
+            raise HTTPException(status_code=422, detail=f"Unable to extract text from file: {filename}")
     
+    return list(zip(documents, [filename for _, _, filename in saved]))
+
+
+def upload_response(file_id: str, files: List[Tuple[StoredDocument, str]]) -> UploadResponse:
+    file_infos = [
+        FileInfo(filename=filename, chunkCount=len(document.chunks), documentId=document.doc_id)
+        for document, filename in files
+    ]
+    return UploadResponse(fileId=file_id, files=file_infos, totalChunks=sum(info.chunkCount for info in file_infos))
+
+
+@app.post("/api/upload", response_model=UploadResponse, openapi_extra=UPLOAD_REQUEST_BODY)
+async def upload_files(request: Request, background_tasks: BackgroundTasks):
+    uploaded = await ingest_uploads(request)
+    unique: Dict[str, Tuple[StoredDocument, str]] = {}
+    for document, filename in uploaded:
+        if document.doc_id in unique:
+            # Same content under another name, or listed twice: one reference is enough
+            document_store.release(document)
+            continue
+        unique[document.doc_id] = (document, filename)
+    uploaded = list(unique.values())
     file_id = str(uuid4())
-    sessions[file_id] = SessionEntry(file_paths=saved_paths, chunks=all_chunks, filenames=filenames)
+    entry = SessionEntry(documents=[document for document, _ in uploaded], filenames=[filename for _, filename in uploaded])
+    await run_io(sessions.add, file_id, entry)
+    # Embed the chunks right after responding so chat doesn't pay for indexing
+    background_tasks.add_task(index_session_in_background, entry)
     
-    return UploadResponse(fileId=file_id, files=file_infos, totalChunks=len(all_chunks))
+    return upload_response(file_id, uploaded)
+
+
+async def update_session(file_id: str, entry: SessionEntry, **changes) -> UploadResponse:
+    try:
+        await run_in_pool(sessions.update, file_id, entry, **changes)
+    except SessionChangedError:
+        raise HTTPException(status_code=409, detail="The session was changed by another request. Please try again.")
+    return upload_response(file_id, list(zip(entry.documents, entry.filenames)))
+
+
+@app.post("/api/sessions/{file_id}/files", response_model=UploadResponse, openapi_extra=UPLOAD_REQUEST_BODY)
+async def add_session_files(file_id: str, request: Request, background_tasks: BackgroundTasks):
+    """
+    Add files to an existing upload session. Only the new files are extracted,
+    chunked and embedded; content already in the session is skipped. Generated
+    results are cached by content, so the next request regenerates for the
+    new file set (map-reduce notes reuse sections whose text is unchanged).
+    """
+    entry = await sessions.aget(file_id)
+    if not entry:
+        raise HTTPException(status_code=404, detail="Upload session not found.")
+    uploaded = await ingest_uploads(request)
+    response = await update_session(file_id, entry, added=uploaded)
+    # Documents already in the session are indexed; this only embeds the new ones
+    background_tasks.add_task(index_session_in_background, entry)
+    return response
+
+
+@app.delete("/api/sessions/{file_id}/files/{file_ref}", response_model=UploadResponse)
+async def remove_session_file(file_id: str, file_ref: str):
+    """
+    Remove a file, given its documentId or filename, from an upload session.
+    Its chunks and embeddings are deleted unless another session has the same content.
+    """
+    entry = await sessions.aget(file_id)
+    if not entry:
+        raise HTTPException(status_code=404, detail="Upload session not found.")
+    removed = {
+        document.doc_id for document, filename in zip(entry.documents, entry.filenames)
+        if file_ref in (document.doc_id, filename)
+    }
+    if not removed:
+        raise HTTPException(status_code=404, detail=f"File not found in this session: {file_ref}")
+    if all(document.doc_id in removed for document in entry.documents):
+        raise HTTPException(status_code=400, detail="A session needs at least one file.")
+    return await update_session(file_id, entry, removed=removed)
 
 
 @app.post("/api/generate", response_model=GenerateResponse)
 async def generate(file_input: GenerateRequest):
-    entry = sessions.get(file_input.fileId)
+    entry = await sessions.aget(file_input.fileId)
     if not entry:
         raise HTTPException(status_code=404, detail="Upload session not found.")
 
-    combined_text = " ".join(chunk.page_content for chunk in entry.chunks).strip()
+    combined_text = entry.combined_text
     if not combined_text:
         raise HTTPException(status_code=422, detail="No text found for flashcard generation.")
 
     num_cards = file_input.numCards if file_input.numCards and file_input.numCards > 0 else 10
     difficulty = file_input.difficulty if file_input.difficulty else "medium"
 
-    cards = generate_flashcards(combined_text, num_cards=num_cards, difficulty=difficulty)
-    # Create vector DB with metadata from all files if not already created
-    if not entry.vector_store:
-        docs_for_db = [Document(page_content=combined_text, metadata={"sources": ", ".join(entry.filenames)})]
-        entry.vector_store = create_vector_db(docs_for_db)
+    flashcards = await flashcards_for_text(combined_text, entry.chunks, num_cards, difficulty)
 
-    card_payload = [FlashcardDTO(q=card.q, a=card.a) for card in cards]
-
-    return GenerateResponse(cards=card_payload)
+    return flashcards_response(flashcards)
 
 
 class NotesResponse(BaseModel):
@@ -186,29 +420,28 @@ class NotesResponse(BaseModel):
     detailedNotes: str
 
 
+def notes_response(notes: ConsolidatedNotes) -> NotesResponse:
+    return NotesResponse(
+        title=notes.title,
+        summary=notes.summary,
+        keyPoints=notes.key_points,
+        detailedNotes=notes.detailed_notes
+    )
+
+
 @app.post("/api/generate-notes", response_model=NotesResponse)
 async def generate_consolidated_notes(file_input: GenerateRequest):
-    entry = sessions.get(file_input.fileId)
+    entry = await sessions.aget(file_input.fileId)
     if not entry:
         raise HTTPException(status_code=404, detail="Upload session not found.")
     
-    combined_text = " ".join(chunk.page_content for chunk in entry.chunks).strip()
+    combined_text = entry.combined_text
     if not combined_text:
         raise HTTPException(status_code=422, detail="No text found for notes generation.")
     
-    notes = generate_notes(combined_text)
-    
-    # Create vector DB with metadata from all files if not already created
-    if not entry.vector_store:
-        docs_for_db = [Document(page_content=combined_text, metadata={"sources": ", ".join(entry.filenames)})]
-        entry.vector_store = create_vector_db(docs_for_db)
+    notes = await notes_for_text(combined_text, entry.chunks)
     
-    return NotesResponse(
-        title=notes.title,
-        summary=notes.summary,
-        keyPoints=notes.key_points,
-        detailedNotes=notes.detailed_notes
-    )
+    return notes_response(notes)
 
 
 class QuizQuestionDTO(BaseModel):
@@ -222,6 +455,18 @@ class QuizResponse(BaseModel):
     questions: List[QuizQuestionDTO]
 
 
+def quiz_response(quiz: QuizList) -> QuizResponse:
+    return QuizResponse(questions=[
+        QuizQuestionDTO(
+            question=q.question,
+            options=q.options,
+            correctAnswer=q.correct_answer,
+            explanation=q.explanation
+        )
+        for q in quiz.questions
+    ])
+
+
 class QuizRequest(BaseModel):
     fileId: str
     numQuestions: Optional[int] = None
@@ -230,40 +475,209 @@ class QuizRequest(BaseModel):
 
 @app.post("/api/generate-quiz", response_model=QuizResponse)
 async def generate_quiz_endpoint(quiz_input: QuizRequest):
-    entry = sessions.get(quiz_input.fileId)
+    entry = await sessions.aget(quiz_input.fileId)
     if not entry:
         raise HTTPException(status_code=404, detail="Upload session not found.")
     
-    combined_text = " ".join(chunk.page_content for chunk in entry.chunks).strip()
+    combined_text = entry.combined_text
     if not combined_text:
         raise HTTPException(status_code=422, detail="No text found for quiz generation.")
     
     num_questions = quiz_input.numQuestions if quiz_input.numQuestions and quiz_input.numQuestions > 0 else 5
     difficulty = quiz_input.difficulty if quiz_input.difficulty else "medium"
     
-    quiz = generate_quiz(combined_text, num_questions=num_questions, difficulty=difficulty)
+    quiz = await quiz_for_text(combined_text, entry.chunks, num_questions, difficulty)
     
-    # Create vector DB if not already created
-    if not entry.vector_store:
-        docs_for_db = [Document(page_content=combined_text, metadata={"sources": ", ".join(entry.filenames)})]
-        entry.vector_store = create_vector_db(docs_for_db)
+    return quiz_response(quiz)
+
+
+class ArtifactRequest(BaseModel):
+    type: Literal["notes", "flashcards", "quiz"]
+    numCards: Optional[int] = None
+    numQuestions: Optional[int] = None
+    difficulty: Optional[str] = None
+
+
+class BatchGenerateRequest(BaseModel):
+    fileId: str
+    artifacts: List[ArtifactRequest]
+
+
+class BatchGenerateResponse(BaseModel):
+    notes: Optional[NotesResponse] = None
+    flashcards: Optional[GenerateResponse] = None
+    quiz: Optional[QuizResponse] = None
+
+
+async def prepare_batch(batch_input: BatchGenerateRequest):
+    """
+    Validate a batch request and do the preprocessing every artifact shares.
+    """
+    entry = await sessions.aget(batch_input.fileId)
+    if not entry:
+        raise HTTPException(status_code=404, detail="Upload session not found.")
+    if not batch_input.artifacts:
+        raise HTTPException(status_code=400, detail="At least one artifact is required.")
+    types = [artifact.type for artifact in batch_input.artifacts]
+    if len(set(types)) != len(types):
+        raise HTTPException(status_code=400, detail="Each artifact type may only be requested once.")
     
-    questions_payload = [
-        QuizQuestionDTO(
-            question=q.question,
-            options=q.options,
-            correctAnswer=q.correct_answer,
-            explanation=q.explanation
-        )
-        for q in quiz.questions
-    ]
+    combined_text = entry.combined_text
+    if not combined_text:
+        raise HTTPException(status_code=422, detail="No text found for generation.")
+    return entry, combined_text
+
+
+async def build_artifact(artifact: ArtifactRequest, text: str, chunks: List[Document]):
+    difficulty = artifact.difficulty if artifact.difficulty else "medium"
+    if artifact.type == "notes":
+        return notes_response(await notes_for_text(text, chunks))
+    if artifact.type == "flashcards":
+        num_cards = artifact.numCards if artifact.numCards and artifact.numCards > 0 else 10
+        return flashcards_response(await flashcards_for_text(text, chunks, num_cards, difficulty))
+    num_questions = artifact.numQuestions if artifact.numQuestions and artifact.numQuestions > 0 else 5
+    return quiz_response(await quiz_for_text(text, chunks, num_questions, difficulty))
+
+
+@app.post("/api/generate-batch", response_model=BatchGenerateResponse)
+async def generate_batch(batch_input: BatchGenerateRequest):
+    """
+    Generate several artifacts for one upload concurrently and return them together.
+    """
+    entry, combined_text = await prepare_batch(batch_input)
+    chunks = entry.chunks
+    
+    results = await asyncio.gather(
+        *(build_artifact(artifact, combined_text, chunks) for artifact in batch_input.artifacts)
+    )
+    return BatchGenerateResponse(**{
+        artifact.type: result for artifact, result in zip(batch_input.artifacts, results)
+    })
+
+
+@app.post("/api/generate-batch/stream")
+async def generate_batch_stream(batch_input: BatchGenerateRequest):
+    """
+    Server-sent events version of /api/generate-batch: one `artifact` event per
+    artifact as soon as it is ready (or an `error` event for it), then `done`.
+    """
+    entry, combined_text = await prepare_batch(batch_input)
+    chunks = entry.chunks
     
-    return QuizResponse(questions=questions_payload)
+    async def build(artifact: ArtifactRequest):
+        try:
+            return artifact.type, await build_artifact(artifact, combined_text, chunks), None
+        except Exception as e:
+            print(f"Error generating {artifact.type}: {e}")
+            return artifact.type, None, f"Unable to generate {artifact.type}."
+    
+    async def event_stream():
+        tasks = [asyncio.create_task(build(artifact)) for artifact in batch_input.artifacts]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                artifact_type, result, error = await next_done
+                if error:
+                    yield sse_event("error", {"type": artifact_type, "message": error})
+                else:
+                    yield sse_event("artifact", {"type": artifact_type, "data": result.model_dump()})
+            yield sse_event("done", {})
+        finally:
+            # Client went away: stop generating what nobody will read
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+class JobResponse(BaseModel):
+    jobId: str
+    status: str
+
+
+@app.post("/api/jobs", response_model=JobResponse, status_code=202)
+async def create_generation_job(batch_input: BatchGenerateRequest):
+    """
+    Start generating a batch in the background and return its job id right away.
+    An identical request for the same upload returns the job already running.
+    """
+    entry, combined_text = await prepare_batch(batch_input)
+    chunks = entry.chunks
+    artifacts = batch_input.artifacts
+    key = cache_key(
+        "job", combined_text,
+        {"fileId": batch_input.fileId, "artifacts": sorted((a.model_dump() for a in artifacts), key=lambda a: a["type"])},
+        LLM_MODEL,
+    )
+    
+    async def run(context: JobContext) -> dict:
+        async def build(artifact: ArtifactRequest):
+            try:
+                return artifact.type, await build_artifact(artifact, combined_text, chunks)
+            except Exception as e:
+                print(f"Error generating {artifact.type}: {e}")
+                return artifact.type, None
+        
+        failed = []
+        tasks = [asyncio.create_task(build(artifact)) for artifact in artifacts]
+        try:
+            for done, next_done in enumerate(asyncio.as_completed(tasks), start=1):
+                artifact_type, result = await next_done
+                if result is None:
+                    failed.append(artifact_type)
+                    context.report(done / len(tasks), f"Unable to generate {artifact_type}.")
+                else:
+                    context.report(done / len(tasks), f"Generated {artifact_type}.", {artifact_type: result.model_dump()})
+        finally:
+            for task in tasks:
+                task.cancel()
+        if len(failed) == len(tasks):
+            raise RuntimeError("Unable to generate any of the requested artifacts.")
+        return BatchGenerateResponse(**context.partial).model_dump(exclude_none=True)
+    
+    job = job_manager.submit(key, "generate-batch", run)
+    return JobResponse(jobId=job.id, status=job.status)
+
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    Poll a job: status, progress (0-1), artifacts finished so far and the final result.
+    """
+    job = await job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job.snapshot()
+
+
+@app.get("/api/jobs/{job_id}/events")
+async def stream_job(job_id: str):
+    """
+    Server-sent `progress` events for a job until it finishes, then `done`.
+    """
+    if await job_manager.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    
+    async def event_stream():
+        async for snapshot in job_manager.subscribe(job_id):
+            yield sse_event("progress", snapshot)
+        yield sse_event("done", {})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 class ChatRequest(BaseModel):
     fileId: str
     question: str
+    # Separate threads of chat memory within one upload; omitted means the session's default
+    conversationId: Optional[str] = None
 
 
 class ChatResponse(BaseModel):
@@ -271,19 +685,54 @@ class ChatResponse(BaseModel):
     sources: str
 
 
-@app.post("/api/chat", response_model=ChatResponse)
-async def chat_endpoint(chat_input: ChatRequest):
-    entry = sessions.get(chat_input.fileId)
+async def lookup_cached_answer(entry: SessionEntry, question: str):
+    """
+    Check the semantic answer cache for this session's documents. Returns
+    (content key, cached answer or None, question embedding for storing).
+    """
+    content = content_key([document.doc_id for document in entry.documents], entry.filenames, LLM_MODEL)
+    if not answer_cache.enabled:
+        return content, None, None
+    cached, question_vector = await run_in_pool(answer_cache.lookup, content, question)
+    return content, cached, question_vector
+
+
+async def prepare_chat(chat_input: ChatRequest):
+    """
+    Load the session and its conversation. Follow-up questions are rewritten
+    into standalone ones for retrieval and the answer cache.
+    """
+    entry = await sessions.aget(chat_input.fileId)
     if not entry:
         raise HTTPException(status_code=404, detail="Upload session not found.")
     
-    # Create vector DB if not already created
-    if not entry.vector_store:
-        combined_text = " ".join(chunk.page_content for chunk in entry.chunks).strip()
-        docs_for_db = [Document(page_content=combined_text, metadata={"sources": ", ".join(entry.filenames)})]
-        entry.vector_store = create_vector_db(docs_for_db)
+    conversation = await get_conversation(entry, chat_input.fileId, chat_input.conversationId)
+    # Waits for the previous turn to be recorded (and summarized if needed)
+    async with conversation.lock:
+        history = conversation.history()
+    search_query = await arewrite_question(chat_input.question, history)
+    return entry, conversation, history, search_query
+
+
+@app.post("/api/chat", response_model=ChatResponse)
+async def chat_endpoint(chat_input: ChatRequest, background_tasks: BackgroundTasks):
+    entry, conversation, history, search_query = await prepare_chat(chat_input)
     
-    result = answer_question(chat_input.question, entry.vector_store)
+    content, cached, question_vector = await lookup_cached_answer(entry, search_query)
+    if cached:
+        result = {"answer": cached.answer, "sources": cached.sources}
+    else:
+        # Usually already built by the upload background task; otherwise finish it now
+        vector_store = await run_in_pool(build_session_index, entry)
+        
+        result = await aanswer_question(chat_input.question, vector_store, history, search_query)
+        if question_vector is not None and result["answer"] != ANSWER_ERROR_MESSAGE:
+            answer_cache.store(content, search_query, question_vector, result["answer"], result["sources"])
+    
+    if result["answer"] != ANSWER_ERROR_MESSAGE:
+        background_tasks.add_task(
+            record_turn, chat_input.fileId, chat_input.conversationId, conversation, chat_input.question, result["answer"]
+        )
     
     return ChatResponse(
         answer=result["answer"],
@@ -291,53 +740,90 @@ async def chat_endpoint(chat_input: ChatRequest):
     )
 
 
-@app.get("/api/download-notes/{file_id}")
-async def download_notes(file_id: str):
-    entry = sessions.get(file_id)
-    if not entry:
-        raise HTTPException(status_code=404, detail="Upload session not found.")
+@app.post("/api/chat/stream")
+async def chat_stream_endpoint(chat_input: ChatRequest):
+    """
+    Server-sent events version of /api/chat: a `sources` event once retrieval
+    finishes, `token` events as the answer streams in, then `done`.
+    """
+    entry, conversation, history, search_query = await prepare_chat(chat_input)
     
-    combined_text = " ".join(chunk.page_content for chunk in entry.chunks).strip()
-    if not combined_text:
-        raise HTTPException(status_code=422, detail="No text found for notes generation.")
+    content, cached, question_vector = await lookup_cached_answer(entry, search_query)
     
-    # Generate notes
-    notes = generate_notes(combined_text)
+    async def cached_stream():
+        yield sse_event("sources", {"sources": cached.sources})
+        yield sse_event("token", {"text": cached.answer})
+        yield sse_event("done", {})
+        await record_turn(chat_input.fileId, chat_input.conversationId, conversation, chat_input.question, cached.answer)
     
-    # Create DOCX document
-    doc = DocxDocument()
+    if cached:
+        return StreamingResponse(
+            cached_stream(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
     
-    # Add title
-    title = doc.add_heading(notes.title, level=0)
-    title.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
+    vector_store = await run_in_pool(build_session_index, entry)
     
-    # Add summary section
-    doc.add_heading('Summary', level=1)
-    summary_para = doc.add_paragraph(notes.summary)
-    summary_para.paragraph_format.space_after = Pt(12)
+    async def event_stream():
+        sources = ""
+        tokens = []
+        failed = False
+        async for kind, value in astream_answer(chat_input.question, vector_store, history, search_query):
+            if kind == "sources":
+                sources = value
+                yield sse_event("sources", {"sources": value})
+            elif kind == "token":
+                tokens.append(value)
+                yield sse_event("token", {"text": value})
+            else:
+                failed = True
+                yield sse_event("error", {"message": value})
+        # Only complete answers are cached and remembered; a client that disconnects never gets here
+        answer = "".join(tokens).strip()
+        if question_vector is not None and answer and not failed:
+            answer_cache.store(content, search_query, question_vector, answer, sources)
+        yield sse_event("done", {})
+        if answer and not failed:
+            await record_turn(chat_input.fileId, chat_input.conversationId, conversation, chat_input.question, answer)
     
-    # Add key points section
-    doc.add_heading('Key Points', level=1)
-    for point in notes.key_points:
-        doc.add_paragraph(point, style='List Bullet')
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+ExportFormatName = Literal["docx", "md", "pdf"]
+
+
+@app.get("/api/download-notes/{file_id}")
+async def download_notes(file_id: str, request: Request, format: ExportFormatName = "docx"):
+    """
+    Download the session's notes as DOCX, Markdown or PDF. Files are
+    rendered off the event loop from the generated notes (generating them
+    only if this session has none yet) and cached by content, so repeat
+    downloads are served from disk; the ETag allows conditional and range requests.
+    """
+    entry = await sessions.aget(file_id)
+    if not entry:
+        raise HTTPException(status_code=404, detail="Upload session not found.")
     
-    # Add detailed notes section
-    doc.add_heading('Detailed Notes', level=1)
-    detailed_para = doc.add_paragraph(notes.detailed_notes)
-    detailed_para.paragraph_format.space_after = Pt(12)
+    combined_text = entry.combined_text
+    if not combined_text:
+        raise HTTPException(status_code=422, detail="No text found for notes generation.")
     
-    # Save to BytesIO
-    docx_file = io.BytesIO()
-    doc.save(docx_file)
-    docx_file.seek(0)
+    # Reuses the notes already generated for this text when cached
+    notes = await notes_for_text(combined_text, entry.chunks)
+    if notes == NOTES_ERROR:
+        raise HTTPException(status_code=502, detail="Notes could not be generated. Please try again.")
     
-    # Return as streaming response
-    filename = f"{notes.title.replace(' ', '_')}.docx"
-    return StreamingResponse(
-        docx_file,
-        media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-        headers={"Content-Disposition": f"attachment; filename={filename}"}
-    )
+    export = await run_in_pool(export_cache.get, notes, format)
+    # Revalidate every time: the same URL serves new notes once the session's files change
+    headers = {"ETag": export.etag, "Cache-Control": "private, no-cache"}
+    if export.etag in {tag.strip() for tag in request.headers.get("if-none-match", "").split(",")}:
+        return Response(status_code=304, headers=headers)
+    return FileResponse(export.path, media_type=export.media_type, filename=export.filename, headers=headers)
 
 
 # Serve static files (frontend) - must be after API routes
@@ -359,6 +845,9 @@ if static_dir.exists():
         raise HTTPException(status_code=404, detail="Not found")
 
 
+startup_state.imported()
+
+
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 8000))
     uvicorn.run("main:app", host="0.0.0.0", port=port, reload=False)
@@ -0,0 +1,225 @@
+"""Map-reduce generation: cover the whole document with parallel LLM calls over chunk groups."""
+
+from __future__ import annotations
+
+import asyncio
+import os
+from typing import Awaitable, Callable, List, Sequence, TypeVar
+
+from langchain_core.documents import Document
+
+from backend.llm_gateway import LLM_COMPLETION_TOKENS, LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE
+from backend.prompting import FLASHCARDS_PROMPT_TOKENS, NOTES_PROMPT_TOKENS, QUIZ_PROMPT_TOKENS, estimate_tokens, fit_to_budget, pack_groups, pack_texts
+from backend.poc_app import (
+    LLM_MODEL, NOTES_ERROR, ConsolidatedNotes, Flashcard, FlashcardList, QuizList,
+    agenerate_flashcards, agenerate_notes, agenerate_quiz, flashcards_prompt, notes_llm, notes_prompt, parse_notes, quiz_prompt,
+)
+from backend.result_cache import get_or_generate
+
+
+# Beyond this many groups each group samples its span of the document evenly
+MAP_MAX_GROUPS = int(os.getenv("MAP_MAX_GROUPS", 12))
+# Map calls in flight per request (on top of the worker-wide LLM_CONCURRENCY)
+MAP_CONCURRENCY = int(os.getenv("MAP_CONCURRENCY", 4))
+# One request's calls (map and reduce) must fit in this much of the model's
+# per-minute limits, so it never waits on its own rate limit for longer
+MAP_RATE_BUDGET_SECONDS = float(os.getenv("MAP_RATE_BUDGET_SECONDS", 60))
+# Bumped whenever the map-reduce output changes, so cached results are regenerated
+STRATEGY = "mapreduce-v2"
+
+# Each generator's prompt budget is both its single-pass limit and its map group size
+BUDGETS = {
+    "notes": NOTES_PROMPT_TOKENS,
+    "flashcards": FLASHCARDS_PROMPT_TOKENS,
+    "quiz": QUIZ_PROMPT_TOKENS,
+}
+
+# Prompt around the document text, for estimating what each call reserves
+PROMPTS = {
+    "notes": notes_prompt,
+    "flashcards": flashcards_prompt,
+    "quiz": quiz_prompt,
+}
+# Calls made after the map step
+REDUCE_CALLS = {"notes": 1, "flashcards": 0, "quiz": 0}
+
+T = TypeVar("T")
+
+
+def map_group_limit(kind: str) -> int:
+    """
+    Most map groups whose calls, with the reduce call, fit within
+    MAP_RATE_BUDGET_SECONDS of the model's token and request limits. Each call
+    reserves its whole prompt plus LLM_COMPLETION_TOKENS from the gateway.
+    """
+    limit = MAP_MAX_GROUPS
+    minutes = MAP_RATE_BUDGET_SECONDS / 60
+    if LLM_TOKENS_PER_MINUTE > 0:
+        per_call = estimate_tokens(PROMPTS[kind]("")) + BUDGETS[kind] + LLM_COMPLETION_TOKENS
+        limit = min(limit, int(LLM_TOKENS_PER_MINUTE * minutes // per_call) - REDUCE_CALLS[kind])
+    if LLM_REQUESTS_PER_MINUTE > 0:
+        limit = min(limit, int(LLM_REQUESTS_PER_MINUTE * minutes) - REDUCE_CALLS[kind])
+    return limit
+
+
+def needs_map_reduce(kind: str, text: str) -> bool:
+    """Over budget, and the rate limits leave room for more than one map group."""
+    return estimate_tokens(text) > BUDGETS[kind] and map_group_limit(kind) > 1
+
+
+def strategy_params(kind: str, text: str) -> dict:
+    """Cache-key parameters describing how this input will be generated."""
+    if needs_map_reduce(kind, text):
+        return {"strategy": STRATEGY, "budget": BUDGETS[kind], "maxGroups": map_group_limit(kind)}
+    return {"strategy": "single" if estimate_tokens(text) <= BUDGETS[kind] else "sampled", "budget": BUDGETS[kind]}
+
+
+def single_pass_text(kind: str, text: str, chunks: Sequence[Document]) -> str:
+    """The text for one call: all of it if it fits, else an evenly spread sample of its chunks."""
+    if estimate_tokens(text) <= BUDGETS[kind]:
+        return text
+    return pack_texts([chunk.page_content for chunk in chunks], BUDGETS[kind])
+
+
+def group_chunks(chunks: Sequence[Document], budget: int, max_groups: int = MAP_MAX_GROUPS) -> List[str]:
+    """
+    Pack consecutive chunks into at most max_groups texts of budget estimated tokens.
+    When the document is larger than that, each group covers an equal span of
+    chunks and packs a representative sample of it.
+    """
+    texts = [chunk.page_content for chunk in chunks]
+    groups = pack_groups(texts, budget)
+    if len(groups) <= max_groups:
+        return groups
+
+    span = -(-len(texts) // max_groups)
+    return [pack_texts(texts[start:start + span], budget) for start in range(0, len(texts), span)]
+
+
+def allocate(total: int, weights: Sequence[int]) -> List[int]:
+    """Split total items across groups proportionally to weights (largest remainder)."""
+    weight_sum = sum(weights) or 1
+    shares = [total * weight / weight_sum for weight in weights]
+    counts = [int(share) for share in shares]
+    by_remainder = sorted(range(len(weights)), key=lambda i: shares[i] - counts[i], reverse=True)
+    for i in by_remainder[:total - sum(counts)]:
+        counts[i] += 1
+    return counts
+
+
+async def _map(groups: Sequence[str], call: Callable[[int, str], Awaitable[T]]) -> List[T]:
+    """Run call over every group with MAP_CONCURRENCY in flight; failed groups are dropped."""
+    semaphore = asyncio.Semaphore(MAP_CONCURRENCY)
+
+    async def run(index: int, group: str):
+        async with semaphore:
+            return await call(index, group)
+
+    results = await asyncio.gather(*(run(i, group) for i, group in enumerate(groups)), return_exceptions=True)
+    mapped = []
+    for result in results:
+        if isinstance(result, Exception):
+            print(f"Error in map step:{result}")
+        elif result is not None:
+            mapped.append(result)
+    return mapped
+
+
+def notes_reduce_prompt(sections: Sequence[ConsolidatedNotes]) -> str:
+    outline = "\n\n".join(
+        f"Section {i + 1}: {section.title}\nSummary: {section.summary}\nKey points: " + "; ".join(section.key_points)
+        for i, section in enumerate(sections)
+    )
+    return (
+        "The following are notes for consecutive sections of one document. "
+        "Combine them into JSON with exactly these fields: "
+        "- 'title': a clear, descriptive title for the whole document "
+        "- 'summary': a brief summary of the whole document (2-3 sentences) "
+        "- 'key_points': an array of the most important key points across all sections (3-7 items) "
+        "- 'detailed_notes': an empty string "
+        "\n\nSections:\n" + fit_to_budget(outline, NOTES_PROMPT_TOKENS)
+    )
+
+
+async def section_notes(group: str) -> ConsolidatedNotes:
+    """
+    Notes for one map group, cached by its text: when files are added to or
+    removed from a session, sections whose text is unchanged are reused.
+    """
+    return await get_or_generate(
+        "notes-section", group, {"budget": BUDGETS["notes"]}, LLM_MODEL, ConsolidatedNotes,
+        lambda: agenerate_notes(group),
+        cacheable=lambda notes: notes != NOTES_ERROR,
+    )
+
+
+async def agenerate_notes_for_chunks(text: str, chunks: Sequence[Document]) -> ConsolidatedNotes:
+    if not needs_map_reduce("notes", text):
+        return await agenerate_notes(single_pass_text("notes", text, chunks))
+
+    sections = await _map(group_chunks(chunks, BUDGETS["notes"], map_group_limit("notes")), lambda _, group: section_notes(group))
+    sections = [section for section in sections if section != NOTES_ERROR]
+    if not sections:
+        return NOTES_ERROR.model_copy()
+
+    response = await notes_llm.ainvoke(notes_reduce_prompt(sections))
+    combined = parse_notes(response.content)
+    if combined == NOTES_ERROR:
+        combined = ConsolidatedNotes(
+            title=sections[0].title,
+            summary=" ".join(section.summary for section in sections),
+            key_points=[point for section in sections for point in section.key_points],
+            detailed_notes="",
+        )
+    # Section notes are kept verbatim so detail scales with the document
+    combined.detailed_notes = "\n\n".join(f"{section.title}\n{section.detailed_notes}" for section in sections)
+    return combined
+
+
+async def agenerate_flashcards_for_chunks(text: str, chunks: Sequence[Document], num_cards: int, difficulty: str) -> List[Flashcard]:
+    if not needs_map_reduce("flashcards", text):
+        return await agenerate_flashcards(single_pass_text("flashcards", text, chunks), num_cards=num_cards, difficulty=difficulty)
+
+    groups = group_chunks(chunks, BUDGETS["flashcards"], map_group_limit("flashcards"))
+    counts = allocate(num_cards, [len(group) for group in groups])
+
+    async def generate(index: int, group: str):
+        if not counts[index]:
+            return None
+        cards = await agenerate_flashcards(group, num_cards=counts[index], difficulty=difficulty)
+        # Models sometimes return extra items; keep each group to its share for even coverage
+        return FlashcardList(cards=cards[:counts[index]])
+
+    seen = set()
+    cards = []
+    for result in await _map(groups, generate):
+        for card in result.cards:
+            key = card.q.strip().lower()
+            if key not in seen:
+                seen.add(key)
+                cards.append(card)
+    return cards[:num_cards]
+
+
+async def agenerate_quiz_for_chunks(text: str, chunks: Sequence[Document], num_questions: int, difficulty: str) -> QuizList:
+    if not needs_map_reduce("quiz", text):
+        return await agenerate_quiz(single_pass_text("quiz", text, chunks), num_questions=num_questions, difficulty=difficulty)
+
+    groups = group_chunks(chunks, BUDGETS["quiz"], map_group_limit("quiz"))
+    counts = allocate(num_questions, [len(group) for group in groups])
+
+    async def generate(index: int, group: str):
+        if not counts[index]:
+            return None
+        quiz = await agenerate_quiz(group, num_questions=counts[index], difficulty=difficulty)
+        return QuizList(questions=quiz.questions[:counts[index]])
+
+    seen = set()
+    questions = []
+    for result in await _map(groups, generate):
+        for question in result.questions:
+            key = question.question.strip().lower()
+            if key not in seen:
+                seen.add(key)
+                questions.append(question)
+    return QuizList(questions=questions[:num_questions])
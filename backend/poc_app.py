@@ -1,22 +1,24 @@
-import time
+import uuid
 import tempfile
 from pathlib import Path
-from langchain_groq import ChatGroq
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.schema import Document
-from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
 import os
 from dotenv import load_dotenv
 from pydantic import BaseModel
 from typing import List
 import json
-from backend.file_handler.txt_handler import extract_txt_text
+from backend.file_handler.txt_handler import extract_txt_text, iter_txt_segments
 from backend.file_handler.pdf_handler import extract_pdf_text
-from backend.file_handler.docx_handler import extract_docx_text
+from backend.file_handler.docx_handler import extract_docx_text, iter_docx_segments
+from backend.embeddings import get_embedding_service
+from backend.concurrency import run_in_pool
+from backend.llm_gateway import LLMGateway
+from backend.retrieval import hybrid_search
+from backend.telemetry import JSON_PARSE_FAILURES, TimedIterator, stage
+from backend.extraction import iter_pdf_pages_parallel
+from backend.chunking import iter_chunks
+from backend.prompting import CHAT_CONTEXT_TOKENS, FLASHCARDS_PROMPT_TOKENS, NOTES_PROMPT_TOKENS, QUIZ_PROMPT_TOKENS, fit_to_budget, pack_texts
 
 load_dotenv()
-os.environ["GROQ_API_KEY"]=os.getenv("GROQ_API_KEY")
 
 def save_uploaded(uploaded):
     suffix=Path(uploaded.name).suffix
@@ -34,30 +36,70 @@ def extract_text(file):
         return extract_docx_text(str(file))
     return ""
 
-def create_chunks(file):
+def iter_segments(file,source):
+    """Lazily yield (text,metadata) segments of a file without building its full text"""
+    ext=file.suffix.lower()
+    metadata={"source":source,"path":str(file)}
+    if ext==".pdf":
+        # Page by page so every chunk keeps the page it came from
+        for page,txt in iter_pdf_pages_parallel(str(file)):
+            yield txt,{**metadata,"page":page}
+    elif ext==".txt":
+        for block in iter_txt_segments(str(file)):
+            yield block,metadata
+    elif ext==".docx":
+        for paragraph in iter_docx_segments(str(file)):
+            yield paragraph+"\n",metadata
+
+def iter_document_chunks(file,source_name=None):
+    """Yield chunks as extraction produces them"""
+    # Uploads are saved under temp names, so callers pass the original filename for metadata
+    segments=TimedIterator(iter_segments(file,source_name or file.name),"extract"+file.suffix.lower())
+    # Chunking time excludes the extraction it waits on
+    return TimedIterator(iter_chunks(segments),"chunk",exclude=segments)
+
+def create_chunks(file,source_name=None):
     chunks=[]
     try:
-        txt=extract_text(file)
-        if not txt or txt.strip()=="":
-            return chunks
-        doc=Document(page_content=txt,metadata={"source":file.name,"path":str(file)})
-        splitter=RecursiveCharacterTextSplitter(chunk_size=1000,chunk_overlap=200)
-        split_docs=splitter.split_documents([doc])
-        for d in split_docs:
-            d.metadata["source"]=file.name
-        chunks.extend(split_docs)
+        chunks.extend(iter_document_chunks(file,source_name))
     except Exception as e:
         print("Error:",str(e))
+        return []
     return chunks
 
-def create_vector_db(all_chunks):
-    embeddings=HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-    name="flashcards_"+str(int(time.time()))
-    store=Chroma(collection_name=name,embedding_function=embeddings,persist_directory="./chroma_db")
-    store.add_documents(all_chunks)
+INDEX_BATCH_SIZE=int(os.getenv("INDEX_BATCH_SIZE",128))
+
+def add_chunks_to_vector_db(store,chunks,start:int=0,batch_size:int=INDEX_BATCH_SIZE):
+    """Embed and add chunks in batches; ids are positional so re-adding a chunk overwrites it"""
+    for i in range(0,len(chunks),batch_size):
+        batch=chunks[i:i+batch_size]
+        ids=[f"chunk-{start+i+j}" for j in range(len(batch))]
+        # Includes embedding the batch, which is also timed on its own as "embed"
+        with stage("vector_add",chunks=len(batch)):
+            store.add_documents(batch,ids=ids)
+
+def create_vector_db(all_chunks,collection_name=None):
+    # Every session shares the worker's embedding model instead of loading its own copy
+    # Deferred: chromadb is slow to import and not needed until something is indexed
+    from langchain_chroma import Chroma
+    name=collection_name or "flashcards_"+uuid.uuid4().hex
+    store=Chroma(collection_name=name,embedding_function=get_embedding_service(),persist_directory="./chroma_db")
+    add_chunks_to_vector_db(store,all_chunks)
     return store
 
-llm=ChatGroq(model="llama-3.1-8b-instant")
+LLM_MODEL=os.getenv("GROQ_MODEL","llama-3.1-8b-instant")
+
+def groq_client(json_mode:bool=False):
+    """
+    ChatGroq client, built by the gateways on first use so the app starts
+    without importing langchain_groq or having GROQ_API_KEY set
+    """
+    from langchain_groq import ChatGroq
+    kwargs={"model_kwargs":{"response_format":{"type":"json_object"}}} if json_mode else {}
+    # Retries are owned by the gateway, not the Groq client
+    return ChatGroq(model=LLM_MODEL,max_retries=0,**kwargs)
+
+llm=LLMGateway(groq_client,LLM_MODEL,"chat")
 
 class Flashcard(BaseModel):
     q:str
@@ -66,21 +108,30 @@ class Flashcard(BaseModel):
 class FlashcardList(BaseModel):
     cards:List[Flashcard]
 
-structured_llm=llm.with_structured_output(FlashcardList)
+structured_llm=LLMGateway(lambda:groq_client().with_structured_output(FlashcardList),LLM_MODEL,"flashcards")
 
-def generate_flashcards(text,num_cards:int=10,difficulty:str="medium"):
+def normalize_difficulty(difficulty:str):
     difficulty=difficulty.lower().strip()
     if difficulty not in {"easy","medium","hard"}:
         difficulty="medium"
+    return difficulty
 
-    prompt=(
+def flashcards_prompt(text,num_cards:int=10,difficulty:str="medium"):
+    difficulty=normalize_difficulty(difficulty)
+    return (
         f"Generate EXACTLY {num_cards} flashcards based on this text, not more or less. "
         "Put them inside a list under the key 'cards'. "
         "Each flashcard must contain 'q' and 'a'. "
         f"The difficulty level of the flashcards should be {difficulty}. "
-        "Text:"+text
+        "Text:"+fit_to_budget(text,FLASHCARDS_PROMPT_TOKENS)
     )
-    result=structured_llm.invoke(prompt)
+
+def generate_flashcards(text,num_cards:int=10,difficulty:str="medium"):
+    result=structured_llm.invoke(flashcards_prompt(text,num_cards,difficulty))
+    return result.cards
+
+async def agenerate_flashcards(text,num_cards:int=10,difficulty:str="medium"):
+    result=await structured_llm.ainvoke(flashcards_prompt(text,num_cards,difficulty))
     return result.cards
 
 class ConsolidatedNotes(BaseModel):
@@ -89,23 +140,31 @@ class ConsolidatedNotes(BaseModel):
     key_points:List[str]
     detailed_notes:str
 
+# Returned when the LLM response can't be parsed; never cached
+NOTES_ERROR=ConsolidatedNotes(
+    title="Study Notes",
+    summary="Unable to generate summary. Please try again.",
+    key_points=["Error generating notes"],
+    detailed_notes="An error occurred while generating notes. Please try uploading your files again."
+)
+
 # Use JSON mode instead of structured output to avoid Groq API issues
-notes_llm=ChatGroq(model="llama-3.1-8b-instant",model_kwargs={"response_format":{"type":"json_object"}})
+notes_llm=LLMGateway(lambda:groq_client(json_mode=True),LLM_MODEL,"notes")
 
-def generate_notes(text):
-    prompt=(
+def notes_prompt(text):
+    return (
         "Generate comprehensive consolidated notes from the following text in JSON format. "
         "The JSON should have exactly these fields: "
         "- 'title': a clear, descriptive title for the notes "
         "- 'summary': a brief summary (2-3 sentences) "
         "- 'key_points': an array of important key points (3-7 items) "
         "- 'detailed_notes': comprehensive detailed notes covering all important information "
-        "\n\nText: "+text[:8000]
+        "\n\nText: "+fit_to_budget(text,NOTES_PROMPT_TOKENS)
     )
-    
+
+def parse_notes(content):
     try:
-        response=notes_llm.invoke(prompt)
-        notes_data=json.loads(response.content)
+        notes_data=json.loads(content)
 
         raw_key_points=notes_data.get("key_points",[])
         if isinstance(raw_key_points,list):
@@ -127,12 +186,16 @@ def generate_notes(text):
         )
     except (json.JSONDecodeError,KeyError) as e:
         print(f"Error parsing notes JSON:{e}")
-        return ConsolidatedNotes(
-            title="Study Notes",
-            summary="Unable to generate summary. Please try again.",
-            key_points=["Error generating notes"],
-            detailed_notes="An error occurred while generating notes. Please try uploading your files again."
-        )
+        JSON_PARSE_FAILURES.inc(kind="notes")
+        return NOTES_ERROR.model_copy()
+
+def generate_notes(text):
+    response=notes_llm.invoke(notes_prompt(text))
+    return parse_notes(response.content)
+
+async def agenerate_notes(text):
+    response=await notes_llm.ainvoke(notes_prompt(text))
+    return parse_notes(response.content)
 
 class QuizQuestion(BaseModel):
     question:str
@@ -143,14 +206,11 @@ class QuizQuestion(BaseModel):
 class QuizList(BaseModel):
     questions:List[QuizQuestion]
 
-quiz_llm=ChatGroq(model="llama-3.1-8b-instant",model_kwargs={"response_format":{"type":"json_object"}})
+quiz_llm=LLMGateway(lambda:groq_client(json_mode=True),LLM_MODEL,"quiz")
 
-def generate_quiz(text,num_questions:int=5,difficulty:str="medium"):
-    difficulty=difficulty.lower().strip()
-    if difficulty not in {"easy","medium","hard"}:
-        difficulty="medium"
-    
-    prompt=(
+def quiz_prompt(text,num_questions:int=5,difficulty:str="medium"):
+    difficulty=normalize_difficulty(difficulty)
+    return (
         f"Generate EXACTLY {num_questions} multiple-choice quiz questions based on this text. "
         f"The difficulty level should be {difficulty}. "
         "Return a JSON object with a 'questions' array. Each question must have: "
@@ -158,12 +218,12 @@ def generate_quiz(text,num_questions:int=5,difficulty:str="medium"):
         "- 'options': an array of exactly 4 answer options "
         "- 'correct_answer': the correct answer (must match one of the options exactly) "
         "- 'explanation': a brief explanation of why this is the correct answer "
-        "\n\nText: "+text[:8000]
+        "\n\nText: "+fit_to_budget(text,QUIZ_PROMPT_TOKENS)
     )
-    
+
+def parse_quiz(content):
     try:
-        response=quiz_llm.invoke(prompt)
-        quiz_data=json.loads(response.content)
+        quiz_data=json.loads(content)
         questions_data=quiz_data.get("questions",[])
         
         questions=[]
@@ -178,54 +238,150 @@ def generate_quiz(text,num_questions:int=5,difficulty:str="medium"):
         return QuizList(questions=questions)
     except (json.JSONDecodeError,KeyError) as e:
         print(f"Error parsing quiz JSON:{e}")
+        JSON_PARSE_FAILURES.inc(kind="quiz")
         return QuizList(questions=[])
 
+def generate_quiz(text,num_questions:int=5,difficulty:str="medium"):
+    response=quiz_llm.invoke(quiz_prompt(text,num_questions,difficulty))
+    return parse_quiz(response.content)
+
+async def agenerate_quiz(text,num_questions:int=5,difficulty:str="medium"):
+    response=await quiz_llm.ainvoke(quiz_prompt(text,num_questions,difficulty))
+    return parse_quiz(response.content)
+
+ANSWER_ERROR_MESSAGE="I apologize, but I encountered an error processing your question. Please try again."
+
+def retrieve_context(question:str,vector_store):
+    """Return the (context, sources) retrieved for a question"""
+    # Retrieve relevant documents: vector and keyword matches, fused
+    docs,_=hybrid_search(question,vector_store)
+    
+    # Combine retrieved context
+    context=""
+    sources_set=set()
+    
+    if docs:
+        # Most relevant first, within the chat context budget
+        context=pack_texts([doc.page_content for doc in docs],CHAT_CONTEXT_TOKENS,ranked=True)
+        # Extract actual filenames from metadata
+        for doc in docs:
+            source=doc.metadata.get("source","")
+            if source and source != "Unknown":
+                page=doc.metadata.get("page")
+                sources_set.add(f"{source} (p. {page})" if page else source)
+    
+    # Format sources
+    if sources_set:
+        sources=", ".join(sorted(sources_set))
+    else:
+        sources=""
+    return context,sources
+
+def answer_prompt(question:str,context:str,history:str=""):
+    # Earlier turns, already compacted to a fixed budget
+    conversation=f"Conversation so far:\n{history}\n\n" if history else ""
+    # Generate answer using LLM with conversational tone
+    if context:
+        return (
+            f"You are a helpful and friendly AI study assistant. Answer the following question based on the context provided. "
+            f"Be conversational, clear, and helpful. If the question is a greeting or casual conversation, respond warmly. "
+            f"If the answer is not in the context, politely say so and offer to help with something else.\n\n"
+            f"{conversation}"
+            f"Context from the documents:\n{context}\n\n"
+            f"Question: {question}\n\n"
+            f"Answer:"
+        )
+    # No context found, but still be conversational
+    return (
+        f"You are a helpful and friendly AI study assistant. {conversation}The user said: '{question}'. "
+        f"Respond in a warm, conversational way. If it's a greeting, greet them back. "
+        f"If it's a question you can't answer without the documents, politely explain that and ask if they have questions about their uploaded materials."
+    )
+
 def answer_question(question:str,vector_store):
     """Use RAG to answer questions based on the vector database"""
     try:
-        # Retrieve relevant documents
-        docs=vector_store.similarity_search(question,k=3)
-        
-        # Combine retrieved context
-        context=""
-        sources_set=set()
-        
-        if docs:
-            context="\n\n".join([doc.page_content for doc in docs])
-            # Extract actual filenames from metadata
-            for doc in docs:
-                source=doc.metadata.get("source","")
-                if source and source != "Unknown":
-                    sources_set.add(source)
-        
-        # Format sources
-        if sources_set:
-            sources=", ".join(sorted(sources_set))
-        else:
-            sources=""
-        
-        # Generate answer using LLM with conversational tone
-        if context:
-            prompt=(
-                f"You are a helpful and friendly AI study assistant. Answer the following question based on the context provided. "
-                f"Be conversational, clear, and helpful. If the question is a greeting or casual conversation, respond warmly. "
-                f"If the answer is not in the context, politely say so and offer to help with something else.\n\n"
-                f"Context from the documents:\n{context}\n\n"
-                f"Question: {question}\n\n"
-                f"Answer:"
-            )
-        else:
-            # No context found, but still be conversational
-            prompt=(
-                f"You are a helpful and friendly AI study assistant. The user said: '{question}'. "
-                f"Respond in a warm, conversational way. If it's a greeting, greet them back. "
-                f"If it's a question you can't answer without the documents, politely explain that and ask if they have questions about their uploaded materials."
-            )
+        context,sources=retrieve_context(question,vector_store)
+        response=llm.invoke(answer_prompt(question,context))
+        answer=response.content.strip()
         
-        response=llm.invoke(prompt)
+        return {"answer":answer,"sources":sources}
+    except Exception as e:
+        print(f"Error answering question:{e}")
+        return {"answer":ANSWER_ERROR_MESSAGE,"sources":""}
+
+def rewrite_prompt(question:str,history:str):
+    return (
+        "Rewrite the student's follow-up question as a standalone question that can be understood "
+        "without the conversation, resolving references like 'it' or 'the second one'. "
+        "If it is already standalone, return it unchanged. Return only the question.\n\n"
+        f"Conversation so far:\n{history}\n\n"
+        f"Follow-up question: {question}\n\n"
+        "Standalone question:"
+    )
+
+async def arewrite_question(question:str,history:str):
+    """Standalone version of a follow-up question for retrieval; the question itself if rewriting fails"""
+    if not history:
+        return question
+    try:
+        response=await llm.ainvoke(rewrite_prompt(question,history))
+        rewritten=response.content.strip().strip('"')
+        return rewritten or question
+    except Exception as e:
+        print(f"Error rewriting question:{e}")
+        return question
+
+def summary_prompt(summary:str,turns:str):
+    return (
+        "Update the running summary of a study conversation with the new turns below. "
+        "Keep the topics discussed, questions asked and key facts from the answers; drop pleasantries. "
+        "Return only the updated summary in a few sentences.\n\n"
+        f"Current summary:\n{summary or '(none)'}\n\n"
+        f"New turns:\n{turns}\n\n"
+        "Updated summary:"
+    )
+
+async def asummarize_history(summary:str,turns:str):
+    """Fold older turns into the rolling summary; falls back to appending them if the LLM fails"""
+    try:
+        response=await llm.ainvoke(summary_prompt(summary,turns))
+        return response.content.strip()
+    except Exception as e:
+        print(f"Error summarizing conversation:{e}")
+        return (summary+"\n\n"+turns).strip()
+
+async def aanswer_question(question:str,vector_store,history:str="",search_query:str=None):
+    """
+    Async answer_question: retrieval runs on the worker pool, the LLM call uses ainvoke.
+    search_query (e.g. a rewritten follow-up) is used for retrieval instead of the question
+    """
+    try:
+        context,sources=await run_in_pool(retrieve_context,search_query or question,vector_store)
+        response=await llm.ainvoke(answer_prompt(question,context,history))
         answer=response.content.strip()
         
         return {"answer":answer,"sources":sources}
     except Exception as e:
         print(f"Error answering question:{e}")
-        return {"answer":"I apologize, but I encountered an error processing your question. Please try again.","sources":""}
+        return {"answer":ANSWER_ERROR_MESSAGE,"sources":""}
+
+async def astream_answer(question:str,vector_store,history:str="",search_query:str=None):
+    """
+    Streaming aanswer_question: yields ("sources",str) once retrieval is done,
+    then ("token",str) for each piece of the answer as the LLM produces it
+    """
+    try:
+        context,sources=await run_in_pool(retrieve_context,search_query or question,vector_store)
+    except Exception as e:
+        print(f"Error answering question:{e}")
+        yield "error",ANSWER_ERROR_MESSAGE
+        return
+    yield "sources",sources
+    try:
+        async for chunk in llm.astream(answer_prompt(question,context,history)):
+            if chunk.content:
+                yield "token",chunk.content
+    except Exception as e:
+        print(f"Error answering question:{e}")
+        yield "error",ANSWER_ERROR_MESSAGE
@@ -0,0 +1,106 @@
+"""Token estimation and budget-aware packing of document text into prompts."""
+
+from __future__ import annotations
+
+import os
+import re
+from typing import List, Sequence
+
+
+# Per-generator budgets for document text, in estimated tokens
+NOTES_PROMPT_TOKENS = int(os.getenv("NOTES_PROMPT_TOKENS", 2000))
+FLASHCARDS_PROMPT_TOKENS = int(os.getenv("FLASHCARDS_PROMPT_TOKENS", 2000))
+QUIZ_PROMPT_TOKENS = int(os.getenv("QUIZ_PROMPT_TOKENS", 2000))
+CHAT_CONTEXT_TOKENS = int(os.getenv("CHAT_CONTEXT_TOKENS", 1200))
+
+_BOILERPLATE = re.compile(r"^(?:Page \d+:|Document Text:)[ \t]*\n", re.MULTILINE)
+_BLANK_RUNS = re.compile(r"\n[ \t]*\n(?:[ \t]*\n)+")
+_SPACE_RUNS = re.compile(r"[ \t]{2,}")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap stand-in for the model tokenizer: about four characters per token
+    for prose, never fewer tokens than whitespace-separated words.
+    """
+    if not text:
+        return 0
+    return max(-(-len(text) // 4), len(text.split()))
+
+
+def strip_boilerplate(text: str) -> str:
+    """Drop extractor headers and collapse whitespace runs that only cost tokens."""
+    text = _BOILERPLATE.sub("", text)
+    text = _BLANK_RUNS.sub("\n\n", text)
+    return _SPACE_RUNS.sub(" ", text).strip()
+
+
+def fit_to_budget(text: str, budget: int) -> str:
+    """Truncate text to at most budget estimated tokens."""
+    text = strip_boilerplate(text)
+    if estimate_tokens(text) <= budget:
+        return text
+    end = budget * 4
+    while end > 0 and estimate_tokens(text[:end]) > budget:
+        end = int(end * 0.9)
+    return text[:end]
+
+
+def _spread_order(count: int) -> List[int]:
+    # Bit-reversed order visits 0, n/2, n/4, 3n/4, ... so any prefix is spread evenly
+    bits = max(1, (count - 1).bit_length())
+    return sorted(range(count), key=lambda i: int(format(i, f"0{bits}b")[::-1], 2))
+
+
+def pack_texts(texts: Sequence[str], budget: int, ranked: bool = False, separator: str = "\n\n") -> str:
+    """
+    Join as many texts as fit in budget estimated tokens.
+
+    ranked=True keeps the most relevant texts first (e.g. retrieval results);
+    otherwise an evenly spread, representative subset is chosen and kept in
+    document order.
+    """
+    cleaned = [strip_boilerplate(text) for text in texts]
+    costs = [estimate_tokens(text) for text in cleaned]
+    separator_cost = estimate_tokens(separator) if separator.strip() else 0
+    if sum(costs) + separator_cost * max(0, len(cleaned) - 1) <= budget:
+        return separator.join(text for text in cleaned if text)
+
+    order = range(len(cleaned)) if ranked else _spread_order(len(cleaned))
+    selected = []
+    used = 0
+    for i in order:
+        cost = costs[i] + (separator_cost if selected else 0)
+        if cleaned[i] and used + cost <= budget:
+            selected.append(i)
+            used += cost
+    if not selected and cleaned:
+        # Nothing fits whole; keep the start of the first candidate
+        first = next(iter(order))
+        return fit_to_budget(cleaned[first], budget)
+    if not ranked:
+        selected.sort()
+    return separator.join(cleaned[i] for i in selected)
+
+
+def pack_groups(texts: Sequence[str], budget: int, separator: str = "\n\n") -> List[str]:
+    """Greedily pack consecutive texts into groups of at most budget estimated tokens."""
+    groups = []
+    parts = []
+    used = 0
+    for text in texts:
+        text = strip_boilerplate(text)
+        cost = estimate_tokens(text)
+        if parts and used + cost + 1 > budget:
+            groups.append(separator.join(parts))
+            parts = []
+            used = 0
+        if cost > budget:
+            text = fit_to_budget(text, budget - 1)
+            cost = estimate_tokens(text)
+        # One token allowance for the separator
+        used += cost + (1 if parts else 0)
+        parts.append(text)
+    if parts:
+        groups.append(separator.join(parts))
+    return groups
@@ -0,0 +1,138 @@
+"""Persistent, size-bounded cache of generated notes, flashcards and quizzes."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Optional, Type, TypeVar
+
+from pydantic import BaseModel
+
+from backend.concurrency import run_io
+
+
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", "./cache/results.sqlite3")
+RESULT_CACHE_MAX_MB = int(os.getenv("RESULT_CACHE_MAX_MB", 256))
+
+M = TypeVar("M", bound=BaseModel)
+
+
+def cache_key(kind: str, text: str, params: dict, model: str) -> str:
+    """Content address for one generation: input text, generator, parameters and model."""
+    digest = hashlib.sha256()
+    digest.update(json.dumps({"kind": kind, "params": params, "model": model}, sort_keys=True).encode())
+    digest.update(b"\0")
+    digest.update(text.encode("utf-8", errors="replace"))
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    SQLite-backed key/value store. Least recently used rows are dropped once
+    the stored payloads exceed max_bytes.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._hits = 0
+        self._misses = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, kind TEXT NOT NULL, value TEXT NOT NULL, "
+                "size INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results(last_used)")
+            self._conn.commit()
+        return self._conn
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._misses += 1
+                return None
+            conn.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+            conn.commit()
+            self._hits += 1
+            return json.loads(row[0])
+
+    def put(self, key: str, kind: str, value: dict):
+        payload = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO results (key, kind, value, size, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, kind, payload, len(payload), time.time()),
+            )
+            self._evict(conn)
+            conn.commit()
+
+    def delete(self, key: str):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM results WHERE key = ?", (key,))
+            conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in conn.execute("SELECT key, size FROM results ORDER BY last_used").fetchall():
+            conn.execute("DELETE FROM results WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def stats(self) -> dict:
+        with self._lock:
+            conn = self._connect()
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+            lookups = self._hits + self._misses
+            return {
+                "entries": entries,
+                "bytes": size,
+                "maxBytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hitRate": round(self._hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+result_cache = ResultCache(RESULT_CACHE_PATH, RESULT_CACHE_MAX_MB * 1024 * 1024)
+
+
+async def get_or_generate(
+    kind: str,
+    text: str,
+    params: dict,
+    model: str,
+    result_type: Type[M],
+    generate: Callable[[], Awaitable[M]],
+    cacheable: Callable[[M], bool] = lambda result: True,
+) -> M:
+    """
+    Return the cached result for this input if there is one, otherwise await
+    generate() and store its result when cacheable() accepts it.
+    """
+    key = cache_key(kind, text, params, model)
+    cached = await run_io(result_cache.get, key)
+    if cached is not None:
+        return result_type.model_validate(cached)
+    result = await generate()
+    if cacheable(result):
+        await run_io(result_cache.put, key, kind, result.model_dump())
+    return result
@@ -0,0 +1,182 @@
+"""Hybrid retrieval: BM25 and vector search fused by reciprocal rank, with optional cross-encoder reranking."""
+
+from __future__ import annotations
+
+import heapq
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+from backend.telemetry import STAGE_SECONDS, span
+
+
+# Chunks passed to the prompt, and candidates fetched from each retriever before fusion
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", 3))
+RETRIEVAL_FETCH_K = int(os.getenv("RETRIEVAL_FETCH_K", 20))
+HYBRID_VECTOR_WEIGHT = float(os.getenv("HYBRID_VECTOR_WEIGHT", 1.0))
+HYBRID_LEXICAL_WEIGHT = float(os.getenv("HYBRID_LEXICAL_WEIGHT", 1.0))
+# sentence-transformers cross-encoder, e.g. cross-encoder/ms-marco-MiniLM-L-6-v2; empty disables reranking
+RERANK_MODEL = os.getenv("RERANK_MODEL", "")
+
+# Standard reciprocal rank fusion constant; damps the difference between top ranks
+RRF_K = 60
+TIMING_WINDOW = 512
+STAGES = ("vector", "lexical", "fusion", "rerank", "total")
+
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
+
+
+class BM25Index:
+    """In-memory inverted index over a fixed list of chunks, scored with Okapi BM25."""
+
+    def __init__(self, documents: Sequence[Document], k1: float = 1.5, b: float = 0.75):
+        self.documents = list(documents)
+        self.size = len(self.documents)
+        self.k1 = k1
+        self.b = b
+        postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        self.lengths = []
+        for i, document in enumerate(self.documents):
+            counts = Counter(tokenize(document.page_content))
+            self.lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                postings[term].append((i, tf))
+        self.postings = dict(postings)
+        self.avg_length = (sum(self.lengths) / self.size) if self.size else 1.0
+        self.idf = {
+            term: math.log(1 + (self.size - len(hits) + 0.5) / (len(hits) + 0.5))
+            for term, hits in self.postings.items()
+        }
+
+    def search(self, query: str, k: int) -> List[Tuple[Document, float]]:
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for i, tf in self.postings[term]:
+                length_norm = 1 - self.b + self.b * self.lengths[i] / (self.avg_length or 1.0)
+                scores[i] += idf * tf * (self.k1 + 1) / (tf + self.k1 * length_norm)
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(self.documents[i], score) for i, score in best]
+
+
+def _key(document: Document) -> Tuple[str, str]:
+    return document.metadata.get("doc_id", ""), document.page_content
+
+
+def fuse(rankings: Sequence[Tuple[float, Sequence[Document]]], k: int) -> List[Document]:
+    """Weighted reciprocal rank fusion of several ranked lists; duplicates are merged."""
+    scores: Dict[Tuple[str, str], float] = defaultdict(float)
+    documents: Dict[Tuple[str, str], Document] = {}
+    for weight, ranked in rankings:
+        for rank, document in enumerate(ranked):
+            key = _key(document)
+            scores[key] += weight / (RRF_K + rank + 1)
+            documents.setdefault(key, document)
+    best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+    return [documents[key] for key, _ in best]
+
+
+class Reranker:
+    """Lazily loaded sentence-transformers cross-encoder."""
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self._model = None
+        self._lock = threading.Lock()
+
+    def rerank(self, query: str, documents: Sequence[Document], k: int) -> List[Document]:
+        if not documents:
+            return []
+        with self._lock:
+            if self._model is None:
+                from sentence_transformers import CrossEncoder
+
+                self._model = CrossEncoder(self.model_name, device="cpu")
+            scores = self._model.predict([(query, document.page_content) for document in documents])
+        order = sorted(range(len(documents)), key=lambda i: scores[i], reverse=True)
+        return [documents[i] for i in order[:k]]
+
+
+_reranker = Reranker(RERANK_MODEL) if RERANK_MODEL else None
+_timings = {stage: deque(maxlen=TIMING_WINDOW) for stage in STAGES}
+
+
+def hybrid_search(
+    query: str,
+    index,
+    k: int = RETRIEVAL_K,
+    fetch_k: int = RETRIEVAL_FETCH_K,
+) -> Tuple[List[Document], Dict[str, float]]:
+    """
+    Retrieve k chunks for query from a vector store. Stores that also offer
+    lexical_search (e.g. SessionIndex) get BM25 results fused in; without a
+    reranker the fused order is final. Returns the chunks and per-stage
+    timings in milliseconds.
+    """
+    with span("retrieval", k=k, fetch_k=fetch_k):
+        candidates, timings = _hybrid_search(query, index, k, max(k, fetch_k))
+    for name, seconds in timings.items():
+        _timings[name].append(seconds)
+        STAGE_SECONDS.observe(seconds, stage=f"retrieval.{name}")
+    return candidates, {name: round(seconds * 1000, 2) for name, seconds in timings.items()}
+
+
+def _hybrid_search(query: str, index, k: int, fetch_k: int) -> Tuple[List[Document], Dict[str, float]]:
+    timings = {}
+    started = time.perf_counter()
+
+    stage = time.perf_counter()
+    vector_hits = index.similarity_search(query, k=fetch_k)
+    timings["vector"] = time.perf_counter() - stage
+
+    lexical_hits: List[Document] = []
+    if hasattr(index, "lexical_search") and HYBRID_LEXICAL_WEIGHT > 0:
+        stage = time.perf_counter()
+        lexical_hits = [document for document, _ in index.lexical_search(query, k=fetch_k)]
+        timings["lexical"] = time.perf_counter() - stage
+
+    stage = time.perf_counter()
+    candidates = fuse(
+        [(HYBRID_VECTOR_WEIGHT, vector_hits), (HYBRID_LEXICAL_WEIGHT, lexical_hits)],
+        fetch_k if _reranker is not None else k,
+    )
+    timings["fusion"] = time.perf_counter() - stage
+
+    if _reranker is not None:
+        stage = time.perf_counter()
+        candidates = _reranker.rerank(query, candidates, k)
+        timings["rerank"] = time.perf_counter() - stage
+
+    timings["total"] = time.perf_counter() - started
+    return candidates, timings
+
+
+def retrieval_stats() -> dict:
+    def summary(samples: Sequence[float]) -> Optional[dict]:
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        return {
+            "count": len(ordered),
+            "meanMs": round(sum(ordered) / len(ordered) * 1000, 2),
+            "p95Ms": round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))] * 1000, 2),
+        }
+
+    return {
+        "k": RETRIEVAL_K,
+        "fetchK": RETRIEVAL_FETCH_K,
+        "rerankModel": RERANK_MODEL or None,
+        "stages": {stage: summary(list(samples)) for stage, samples in _timings.items()},
+    }
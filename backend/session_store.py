@@ -0,0 +1,228 @@
+"""SQLite persistence for upload sessions and their documents, shared by every worker process."""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from backend.chunk_store import ChunkStore
+
+
+# Empty keeps sessions in this process only
+SESSION_STORE_PATH = os.getenv("SESSION_STORE_PATH", "./cache/sessions.sqlite3")
+
+
+class SessionStore:
+    """
+    Records each document's file, filename and chunks, and each session's
+    documents, filenames and chat memory, so any worker can rebuild a session on demand.
+    Chroma collections need no mapping: they are named after the document hash.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # Other workers write to the same file; wait for their locks instead of failing
+            self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                "doc_id TEXT PRIMARY KEY, path TEXT NOT NULL, filename TEXT NOT NULL, chunks TEXT NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "file_id TEXT PRIMARY KEY, doc_ids TEXT NOT NULL, filenames TEXT NOT NULL, last_access REAL NOT NULL, "
+                "revision INTEGER NOT NULL DEFAULT 0)"
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(sessions)")}
+            if "revision" not in columns:
+                # Files written before sessions could be updated
+                self._conn.execute("ALTER TABLE sessions ADD COLUMN revision INTEGER NOT NULL DEFAULT 0")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS session_documents ("
+                "file_id TEXT NOT NULL, doc_id TEXT NOT NULL, PRIMARY KEY (file_id, doc_id))"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS conversations ("
+                "file_id TEXT NOT NULL, conversation_id TEXT NOT NULL, state TEXT NOT NULL, "
+                "revision INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (file_id, conversation_id))"
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(conversations)")}
+            if "revision" not in columns:
+                # Files written before workers shared chat memory
+                self._conn.execute("ALTER TABLE conversations ADD COLUMN revision INTEGER NOT NULL DEFAULT 0")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS session_documents_doc ON session_documents(doc_id)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_last_access ON sessions(last_access)")
+            self._conn.commit()
+        return self._conn
+
+    def save_document(self, doc_id: str, path: Path, filename: str, chunks: ChunkStore):
+        payload = json.dumps(chunks.to_payload(), ensure_ascii=False)
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO documents (doc_id, path, filename, chunks) VALUES (?, ?, ?, ?)",
+                (doc_id, str(path), filename, payload),
+            )
+            conn.commit()
+
+    def load_document(self, doc_id: str) -> Optional[Tuple[Path, str, ChunkStore]]:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT path, filename, chunks FROM documents WHERE doc_id = ?", (doc_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        chunks = ChunkStore.from_payload(json.loads(row[2]), doc_id)
+        return Path(row[0]), row[1], chunks
+
+    def document_path(self, doc_id: str) -> Optional[Path]:
+        with self._lock:
+            row = self._connect().execute("SELECT path FROM documents WHERE doc_id = ?", (doc_id,)).fetchone()
+        return Path(row[0]) if row else None
+
+    def delete_document(self, doc_id: str):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,))
+            conn.commit()
+
+    def is_referenced(self, doc_id: str) -> bool:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT 1 FROM session_documents WHERE doc_id = ? LIMIT 1", (doc_id,)
+            ).fetchone()
+        return row is not None
+
+    def save_session(
+        self, file_id: str, doc_ids: List[str], filenames: List[str], expected_revision: Optional[int] = None
+    ) -> Optional[int]:
+        """
+        Create or replace a session and return its new revision. With
+        expected_revision, only a session still at that revision is updated;
+        returns None if another worker changed it first.
+        """
+        row = (json.dumps(doc_ids), json.dumps(filenames, ensure_ascii=False), time.time(), file_id)
+        with self._lock:
+            conn = self._connect()
+            if expected_revision is None:
+                conn.execute(
+                    "INSERT INTO sessions (doc_ids, filenames, last_access, file_id) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(file_id) DO UPDATE SET doc_ids = excluded.doc_ids, filenames = excluded.filenames, "
+                    "last_access = excluded.last_access, revision = sessions.revision + 1",
+                    row,
+                )
+            else:
+                updated = conn.execute(
+                    "UPDATE sessions SET doc_ids = ?, filenames = ?, last_access = ?, revision = revision + 1 "
+                    "WHERE file_id = ? AND revision = ?",
+                    (*row, expected_revision),
+                )
+                if updated.rowcount == 0:
+                    conn.rollback()
+                    return None
+            conn.execute("DELETE FROM session_documents WHERE file_id = ?", (file_id,))
+            conn.executemany(
+                "INSERT OR IGNORE INTO session_documents (file_id, doc_id) VALUES (?, ?)",
+                [(file_id, doc_id) for doc_id in doc_ids],
+            )
+            revision = conn.execute("SELECT revision FROM sessions WHERE file_id = ?", (file_id,)).fetchone()[0]
+            conn.commit()
+        return revision
+
+    def load_session(self, file_id: str) -> Optional[Tuple[List[str], List[str], float, int]]:
+        """Return (doc_ids, filenames, last_access, revision) for a persisted session."""
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT doc_ids, filenames, last_access, revision FROM sessions WHERE file_id = ?", (file_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), json.loads(row[1]), row[2], row[3]
+
+    def session_revision(self, file_id: str) -> Optional[int]:
+        with self._lock:
+            row = self._connect().execute("SELECT revision FROM sessions WHERE file_id = ?", (file_id,)).fetchone()
+        return row[0] if row else None
+
+    def touch_session(self, file_id: str):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("UPDATE sessions SET last_access = ? WHERE file_id = ?", (time.time(), file_id))
+            conn.commit()
+
+    def delete_session(self, file_id: str, idle_before: Optional[float] = None) -> List[str]:
+        """
+        Delete a session and return the documents it referenced. With
+        idle_before, sessions used since then (e.g. by another worker) are kept.
+        """
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT doc_ids, last_access FROM sessions WHERE file_id = ?", (file_id,)).fetchone()
+            if row is None or (idle_before is not None and row[1] >= idle_before):
+                return []
+            conn.execute("DELETE FROM sessions WHERE file_id = ?", (file_id,))
+            conn.execute("DELETE FROM session_documents WHERE file_id = ?", (file_id,))
+            conn.execute("DELETE FROM conversations WHERE file_id = ?", (file_id,))
+            conn.commit()
+        return json.loads(row[0])
+
+    def save_conversation(self, file_id: str, conversation_id: str, state: dict, expected_revision: int) -> Optional[int]:
+        """
+        Store a conversation read at expected_revision (0 if it did not exist)
+        and return its new revision, or None if another worker saved it first.
+        """
+        payload = json.dumps(state, ensure_ascii=False)
+        with self._lock:
+            conn = self._connect()
+            updated = conn.execute(
+                "INSERT INTO conversations (file_id, conversation_id, state, revision) VALUES (?, ?, ?, 1) "
+                "ON CONFLICT(file_id, conversation_id) DO UPDATE SET state = excluded.state, "
+                "revision = conversations.revision + 1 WHERE conversations.revision = ?",
+                (file_id, conversation_id, payload, expected_revision),
+            )
+            row = conn.execute(
+                "SELECT revision FROM conversations WHERE file_id = ? AND conversation_id = ?", (file_id, conversation_id)
+            ).fetchone()
+            # Not written, or inserted afresh although the caller had read an existing (since deleted) row
+            if updated.rowcount == 0 or row[0] != expected_revision + 1:
+                conn.rollback()
+                return None
+            conn.commit()
+        return row[0]
+
+    def load_conversation(self, file_id: str, conversation_id: str) -> Optional[Tuple[dict, int]]:
+        """Return (state, revision) of a stored conversation."""
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT state, revision FROM conversations WHERE file_id = ? AND conversation_id = ?",
+                (file_id, conversation_id),
+            ).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def idle_sessions(self, idle_before: float) -> List[str]:
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT file_id FROM sessions WHERE last_access < ?", (idle_before,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def stats(self) -> dict:
+        with self._lock:
+            conn = self._connect()
+            sessions = conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+            documents = conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+        return {"persistedSessions": sessions, "persistedDocuments": documents}
+
+
+session_store = SessionStore(SESSION_STORE_PATH) if SESSION_STORE_PATH else None
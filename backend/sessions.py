@@ -0,0 +1,390 @@
+"""Bounded, LRU-ordered store for upload sessions and the documents they reference."""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+from backend.chunk_store import Chunk
+from backend.concurrency import run_in_pool, run_io, submit_io, submit_to_pool
+from backend.documents import DocumentStore, SessionIndex, StoredDocument, document_store
+from backend.session_store import SessionStore, session_store
+
+
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", 200))
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", 60 * 60))
+SESSION_MEMORY_BUDGET_MB = int(os.getenv("SESSION_MEMORY_BUDGET_MB", 512))
+SESSION_DISK_BUDGET_MB = int(os.getenv("SESSION_DISK_BUDGET_MB", 2048))
+# How often a live session records its last access in the persistence store
+SESSION_TOUCH_INTERVAL_SECONDS = 60
+
+
+class SessionChangedError(RuntimeError):
+    """Raised when another worker updated a session's files first."""
+
+
+@dataclass
+class SessionEntry:
+    documents: List[StoredDocument]
+    filenames: List[str]
+    last_access: float = field(default_factory=time.monotonic)
+    closed: bool = False
+    # conversation id -> backend.conversation.Conversation
+    conversations: dict = field(default_factory=dict)
+    # Bumped whenever files are added or removed; compared with the persisted session
+    revision: int = 0
+    update_lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+    # (documents list it was built from, text); see combined_text
+    _combined: Optional[Tuple[list, str]] = field(default=None, repr=False)
+
+    @property
+    def chunks(self) -> List[Chunk]:
+        return [chunk for document in self.documents for chunk in document.chunks]
+
+    @property
+    def combined_text(self) -> str:
+        """
+        The text of every document in the session, built on first use and kept
+        until files are added or removed. A single document's text is its
+        chunk buffer itself, so this costs no copy.
+        """
+        documents = self.documents
+        combined = self._combined
+        if combined is None or combined[0] is not documents:
+            combined = (documents, " ".join(document.chunks.text() for document in documents).strip())
+            self._combined = combined
+        return combined[1]
+
+    @property
+    def file_paths(self) -> List[Path]:
+        return [document.path for document in self.documents]
+
+    @property
+    def vector_store(self) -> SessionIndex:
+        return SessionIndex(self.documents, self.filenames)
+
+    @property
+    def memory_bytes(self) -> int:
+        # Approximate: see ChunkStore.nbytes. Shared documents count towards
+        # every session that references them.
+        return sum(document.chunks.nbytes for document in self.documents)
+
+    @property
+    def disk_bytes(self) -> int:
+        return sum(path.stat().st_size for path in self.file_paths if path.exists())
+
+    def close(self):
+        """
+        Release the session's documents; files and collections no other
+        session references are deleted.
+        """
+        # Waits for an update in progress, so documents it adds are released too
+        with self.update_lock:
+            self.closed = True
+            documents = self.documents
+        for document in documents:
+            document_store.release(document)
+
+
+@dataclass
+class _Sizes:
+    memory: int
+    disk: int
+
+
+class SessionManager:
+    """
+    Dict-like session store that enforces a session count, an idle TTL and
+    memory/disk budgets, evicting least recently used sessions first.
+
+    With a persistence store, sessions are saved when added and rebuilt on
+    first access by any worker. Budget evictions only unload a session from
+    this process; expiry and removal delete it for every worker.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = MAX_SESSIONS,
+        ttl_seconds: int = SESSION_TTL_SECONDS,
+        max_memory_bytes: int = SESSION_MEMORY_BUDGET_MB * 1024 * 1024,
+        max_disk_bytes: int = SESSION_DISK_BUDGET_MB * 1024 * 1024,
+        persistence: Optional[SessionStore] = session_store,
+        documents: DocumentStore = document_store,
+    ):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.persistence = persistence
+        self.documents = documents
+        self._entries: "OrderedDict[str, SessionEntry]" = OrderedDict()
+        self._sizes: dict[str, _Sizes] = {}
+        self._lock = threading.RLock()
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+        self._evictions = {"lru": 0, "ttl": 0, "removed": 0, "stale": 0}
+        self._touched: dict[str, float] = {}
+        self._rehydrated = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, file_id: str) -> bool:
+        return self.get(file_id) is not None
+
+    def __setitem__(self, file_id: str, entry: SessionEntry):
+        self.add(file_id, entry)
+
+    def get(self, file_id: str) -> Optional[SessionEntry]:
+        """Return a live session, rebuilding it from the persistence store if needed. May block."""
+        with self._lock:
+            entry = self._entries.get(file_id)
+            if entry is not None:
+                if self._is_expired(entry):
+                    self._evict(file_id, "ttl", forget=True)
+                    return None
+                entry.last_access = time.monotonic()
+                self._entries.move_to_end(file_id)
+                self._touch(file_id)
+                return entry
+        return self._rehydrate(file_id)
+
+    async def aget(self, file_id: str) -> Optional[SessionEntry]:
+        """
+        get() that rebuilds persisted sessions on the worker pool. A live
+        session whose files another worker changed is rebuilt too.
+        """
+        with self._lock:
+            entry = self._entries.get(file_id)
+        if entry is not None and self.persistence is not None:
+            revision = await run_io(self.persistence.session_revision, file_id)
+            if revision is not None and revision != entry.revision:
+                self.unload(file_id, entry)
+        with self._lock:
+            if file_id in self._entries:
+                return self.get(file_id)
+        return await run_in_pool(self.get, file_id)
+
+    def add(self, file_id: str, entry: SessionEntry):
+        """Register a new session; with persistence it is saved first. Blocking."""
+        if self.persistence is not None:
+            entry.revision = self.persistence.save_session(
+                file_id, [document.doc_id for document in entry.documents], entry.filenames
+            )
+        self._insert(file_id, entry)
+
+    def update(
+        self,
+        file_id: str,
+        entry: SessionEntry,
+        added: Sequence[Tuple[StoredDocument, str]] = (),
+        removed: Sequence[str] = (),
+    ) -> List[StoredDocument]:
+        """
+        Append (document, filename) pairs to a live session and drop the
+        documents with the given doc ids. Only the delta is touched: kept
+        documents keep their chunks and collections, removed ones are released
+        (and deleted once unreferenced), and content already in the session is
+        not added twice. Returns the documents actually added. Raises
+        SessionChangedError if another worker updated the session first.
+        Blocking.
+        """
+        with entry.update_lock:
+            if entry.closed:
+                for document, _ in added:
+                    self.documents.release(document)
+                raise SessionChangedError(f"Session {file_id} was unloaded")
+            kept = [(document, filename) for document, filename in zip(entry.documents, entry.filenames) if document.doc_id not in removed]
+            released = [document for document in entry.documents if document.doc_id in removed]
+            present = {document.doc_id for document, _ in kept}
+            new = []
+            for document, filename in added:
+                if document.doc_id in present:
+                    # Same content under another name, or listed twice: one reference is enough
+                    released.append(document)
+                    continue
+                present.add(document.doc_id)
+                new.append((document, filename))
+            documents = [document for document, _ in kept + new]
+            filenames = [filename for _, filename in kept + new]
+
+            if self.persistence is not None:
+                revision = self.persistence.save_session(
+                    file_id, [document.doc_id for document in documents], filenames, expected_revision=entry.revision
+                )
+                if revision is None:
+                    self.unload(file_id, entry)
+                    for document, _ in added:
+                        self.documents.release(document)
+                    raise SessionChangedError(f"Session {file_id} was changed by another request")
+            else:
+                revision = entry.revision + 1
+            # Readers take a snapshot of these lists, so replace rather than mutate them
+            entry.documents, entry.filenames, entry.revision = documents, filenames, revision
+        self.resize(file_id)
+        for document in released:
+            self.documents.release(document)
+        return [document for document, _ in new]
+
+    def unload(self, file_id: str, entry: SessionEntry):
+        """Drop a stale live session from this worker; the next access rebuilds it."""
+        with self._lock:
+            if self._entries.get(file_id) is entry:
+                self._evict(file_id, "stale")
+
+    def _insert(self, file_id: str, entry: SessionEntry):
+        sizes = _Sizes(memory=entry.memory_bytes, disk=entry.disk_bytes)
+        with self._lock:
+            if file_id in self._entries:
+                self._evict(file_id, "removed")
+            self._entries[file_id] = entry
+            self._touched[file_id] = time.time()
+            self._sizes[file_id] = sizes
+            self._memory_bytes += sizes.memory
+            self._disk_bytes += sizes.disk
+            self.evict_expired()
+            self._enforce_budgets(keep=file_id)
+
+    def resize(self, file_id: str):
+        """Recompute a session's footprint after its chunks or files changed."""
+        with self._lock:
+            entry = self._entries.get(file_id)
+            if entry is None:
+                return
+            old = self._sizes[file_id]
+            new = _Sizes(memory=entry.memory_bytes, disk=entry.disk_bytes)
+            self._memory_bytes += new.memory - old.memory
+            self._disk_bytes += new.disk - old.disk
+            self._sizes[file_id] = new
+            self._enforce_budgets(keep=file_id)
+
+    def remove(self, file_id: str) -> bool:
+        with self._lock:
+            if file_id in self._entries:
+                self._evict(file_id, "removed", forget=True)
+                return True
+        if self.persistence is not None and self.persistence.load_session(file_id) is not None:
+            # Live in another worker or not loaded yet
+            submit_to_pool(self._forget, file_id, None)
+            self._evictions["removed"] += 1
+            return True
+        return False
+
+    def evict_expired(self) -> int:
+        with self._lock:
+            expired = [file_id for file_id, entry in self._entries.items() if self._is_expired(entry)]
+            for file_id in expired:
+                self._evict(file_id, "ttl", forget=True)
+            return len(expired)
+
+    def purge_persisted(self) -> int:
+        """Delete persisted sessions no worker has used within the TTL. Blocking."""
+        if self.persistence is None or self.ttl_seconds <= 0:
+            return 0
+        idle_before = time.time() - self.ttl_seconds
+        idle = [file_id for file_id in self.persistence.idle_sessions(idle_before) if file_id not in self._entries]
+        for file_id in idle:
+            self._forget(file_id, idle_before)
+        return len(idle)
+
+    def _rehydrate(self, file_id: str) -> Optional[SessionEntry]:
+        if self.persistence is None:
+            return None
+        stored = self.persistence.load_session(file_id)
+        if stored is None:
+            return None
+        doc_ids, filenames, last_access, revision = stored
+        if self.ttl_seconds > 0 and time.time() - last_access > self.ttl_seconds:
+            self._forget(file_id, time.time() - self.ttl_seconds)
+            return None
+
+        documents = []
+        for doc_id in doc_ids:
+            document = self.documents.acquire(doc_id)
+            if document is None:
+                # Its file is gone; the session cannot be rebuilt
+                for acquired in documents:
+                    self.documents.release(acquired)
+                self._forget(file_id, None)
+                return None
+            documents.append(document)
+
+        entry = SessionEntry(documents=documents, filenames=filenames, revision=revision)
+        with self._lock:
+            existing = self._entries.get(file_id)
+            if existing is None:
+                self._insert(file_id, entry)
+                self._rehydrated += 1
+                submit_io(self.persistence.touch_session, file_id)
+                return entry
+        # Another request rebuilt it first
+        entry.close()
+        return self.get(file_id)
+
+    def _touch(self, file_id: str):
+        # Caller holds the lock; lets other workers see the session is in use
+        now = time.time()
+        if self.persistence is not None and now - self._touched.get(file_id, 0) > SESSION_TOUCH_INTERVAL_SECONDS:
+            self._touched[file_id] = now
+            submit_io(self.persistence.touch_session, file_id)
+
+    def _forget(self, file_id: str, idle_before: Optional[float]):
+        """Delete a persisted session and whatever documents only it referenced."""
+        for doc_id in self.persistence.delete_session(file_id, idle_before):
+            self.documents.collect(doc_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "liveSessions": len(self._entries),
+                "maxSessions": self.max_sessions,
+                "memoryBytes": self._memory_bytes,
+                "maxMemoryBytes": self.max_memory_bytes,
+                "diskBytes": self._disk_bytes,
+                "maxDiskBytes": self.max_disk_bytes,
+                "ttlSeconds": self.ttl_seconds,
+                "evictions": dict(self._evictions),
+                "rehydrated": self._rehydrated,
+                **(self.persistence.stats() if self.persistence is not None else {}),
+            }
+
+    def _is_expired(self, entry: SessionEntry) -> bool:
+        return self.ttl_seconds > 0 and time.monotonic() - entry.last_access > self.ttl_seconds
+
+    def _over_budget(self) -> bool:
+        return (
+            len(self._entries) > self.max_sessions
+            or self._memory_bytes > self.max_memory_bytes
+            or self._disk_bytes > self.max_disk_bytes
+        )
+
+    def _enforce_budgets(self, keep: str):
+        # Oldest first; the session that triggered the check is never evicted
+        while self._over_budget():
+            victim = next((file_id for file_id in self._entries if file_id != keep), None)
+            if victim is None:
+                break
+            self._evict(victim, "lru")
+
+    def _evict(self, file_id: str, reason: str, forget: bool = False):
+        """Unload a session; forget=True also deletes it from the persistence store."""
+        entry = self._entries.pop(file_id)
+        sizes = self._sizes.pop(file_id)
+        self._touched.pop(file_id, None)
+        self._memory_bytes -= sizes.memory
+        self._disk_bytes -= sizes.disk
+        self._evictions[reason] += 1
+        # Cleanup may wait on an index build, so keep it off the caller's thread
+        # An expired session may still be in use by another worker; removal is unconditional
+        idle_before = time.time() - self.ttl_seconds if reason == "ttl" else None
+        submit_to_pool(self._close, file_id, entry, forget, idle_before)
+
+    def _close(self, file_id: str, entry: SessionEntry, forget: bool, idle_before: Optional[float]):
+        if forget and self.persistence is not None:
+            self.persistence.delete_session(file_id, idle_before)
+        entry.close()
@@ -0,0 +1,250 @@
+"""
+Process-wide metrics in the Prometheus text format, per-stage timing and
+optional OpenTelemetry trace spans.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+
+# Requires opentelemetry-api plus an SDK/exporter configured through the standard OTEL_* variables
+TRACE_SPANS = os.getenv("TRACE_SPANS", "0").lower() in {"1", "true", "yes"}
+
+PREFIX = "study_assistant"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, description: str, labels: Sequence[str] = ()):
+        self.name = f"{PREFIX}_{name}"
+        self.description = description
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        return "\n".join([f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}", *self.samples()])
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, description: str, labels: Sequence[str] = ()):
+        super().__init__(name, description, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.label_names, key)} {_number(value)}" for key, value in values]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # label values -> (per-bucket counts, sum, count)
+        self._values: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items())
+        lines = []
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(round(total, 6))}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {count}")
+        return lines
+
+
+class Gauge(Metric):
+    """Read at scrape time from `read`, which returns a number or {label values: number}."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, description: str, read: Callable[[], object], labels: Sequence[str] = ()):
+        super().__init__(name, description, labels)
+        self.read = read
+
+    def samples(self) -> List[str]:
+        try:
+            value = self.read()
+        except Exception as e:
+            print(f"Error reading gauge {self.name}: {e}")
+            return []
+        if not isinstance(value, dict):
+            value = {(): value}
+        return [
+            f"{self.name}{_labels(self.label_names, key if isinstance(key, tuple) else (key,))} {_number(number)}"
+            for key, number in sorted(value.items())
+        ]
+
+
+_metrics: Dict[str, Metric] = {}
+_metrics_lock = threading.Lock()
+
+
+def _register(metric: Metric) -> Metric:
+    with _metrics_lock:
+        return _metrics.setdefault(metric.name, metric)
+
+
+def counter(name: str, description: str, labels: Sequence[str] = ()) -> Counter:
+    return _register(Counter(name, description, labels))
+
+
+def histogram(name: str, description: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+    return _register(Histogram(name, description, labels, buckets))
+
+
+def gauge(name: str, description: str, read: Callable[[], object], labels: Sequence[str] = ()) -> Gauge:
+    return _register(Gauge(name, description, read, labels))
+
+
+def render_metrics() -> str:
+    with _metrics_lock:
+        metrics = list(_metrics.values())
+    return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+STAGE_SECONDS = histogram("stage_seconds", "Time spent in each processing stage.", ("stage",))
+HTTP_REQUESTS = counter("http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+HTTP_SECONDS = histogram("http_request_seconds", "Time until the response starts, by route.", ("method", "route"))
+UNHANDLED_ERRORS = counter("unhandled_errors_total", "Requests that failed with an unexpected exception.", ("route", "error"))
+LLM_SECONDS = histogram("llm_request_seconds", "LLM call latency (time to first token when streaming).", ("gateway", "model"))
+LLM_PROMPT_TOKENS = histogram("llm_prompt_tokens", "Estimated prompt size per LLM call.", ("gateway",), TOKEN_BUCKETS)
+LLM_TOKENS = counter("llm_tokens_total", "Tokens reported by the provider.", ("gateway", "type"))
+LLM_ERRORS = counter("llm_errors_total", "Failed LLM attempts, including retried ones.", ("gateway", "error"))
+JSON_PARSE_FAILURES = counter("json_parse_failures_total", "LLM responses that were not the expected JSON.", ("kind",))
+
+
+_tracer = None
+_tracing = TRACE_SPANS
+
+
+def _get_tracer():
+    global _tracer, _tracing
+    if _tracer is None and _tracing:
+        try:
+            from opentelemetry import trace
+        except ImportError:
+            print("TRACE_SPANS is set but opentelemetry-api is not installed; tracing disabled")
+            _tracing = False
+            return None
+        _tracer = trace.get_tracer("study_assistant")
+    return _tracer
+
+
+def span(name: str, **attributes):
+    """A trace span when TRACE_SPANS is enabled, otherwise a no-op context manager."""
+    tracer = _get_tracer()
+    if tracer is None:
+        return nullcontext()
+    return tracer.start_as_current_span(name, attributes={key: value for key, value in attributes.items() if value is not None})
+
+
+@contextmanager
+def stage(name: str, **attributes) -> Iterator[None]:
+    """Time the enclosed block into stage_seconds{stage=name}, inside a span of the same name."""
+    started = time.perf_counter()
+    with span(name, **attributes):
+        try:
+            yield
+        finally:
+            STAGE_SECONDS.observe(time.perf_counter() - started, stage=name)
+
+
+class TimedIterator:
+    """
+    Wraps a lazy iterable and records the time spent producing its items as
+    one stage observation once it is exhausted. Time spent in an
+    `exclude` TimedIterator it consumes (e.g. extraction under chunking) is
+    not counted twice.
+    """
+
+    def __init__(self, iterable: Iterable, name: str, exclude: Optional["TimedIterator"] = None):
+        self.name = name
+        self.seconds = 0.0
+        self._iterator = iter(iterable)
+        self._exclude = exclude
+        self._recorded = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        started = time.perf_counter()
+        excluded = self._exclude.seconds if self._exclude is not None else 0.0
+        exhausted = False
+        try:
+            return next(self._iterator)
+        except StopIteration:
+            exhausted = True
+            raise
+        finally:
+            inner = self._exclude.seconds - excluded if self._exclude is not None else 0.0
+            self.seconds += time.perf_counter() - started - inner
+            if exhausted:
+                self.record()
+
+    def record(self):
+        if not self._recorded:
+            self._recorded = True
+            STAGE_SECONDS.observe(self.seconds, stage=self.name)
@@ -0,0 +1,197 @@
+"""Streaming multipart upload ingestion with per-file and per-request size limits."""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import Collection, List, Optional, Tuple
+
+from fastapi import HTTPException, Request
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+from backend.concurrency import run_io
+
+
+UPLOAD_BLOCK_SIZE = int(os.getenv("UPLOAD_BLOCK_SIZE_KB", 1024)) * 1024
+MAX_UPLOAD_FILE_BYTES = int(os.getenv("MAX_UPLOAD_FILE_MB", 100)) * 1024 * 1024
+MAX_UPLOAD_REQUEST_BYTES = int(os.getenv("MAX_UPLOAD_REQUEST_MB", 300)) * 1024 * 1024
+
+# OpenAPI description of the body read by read_uploads, for routes that parse it themselves
+UPLOAD_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["files"],
+                    "properties": {"files": {"type": "array", "items": {"type": "string", "format": "binary"}}},
+                }
+            }
+        },
+    }
+}
+
+
+class UploadBudget:
+    """Bytes still allowed for the rest of one upload request."""
+
+    def __init__(self, max_bytes: int = MAX_UPLOAD_REQUEST_BYTES):
+        self.remaining = max_bytes
+
+    def consume(self, size: int):
+        self.remaining -= size
+        if self.remaining < 0:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Upload exceeds the {MAX_UPLOAD_REQUEST_BYTES // (1024 * 1024)} MB request limit.",
+            )
+
+
+class _FilePart:
+    """One uploaded file: received bytes are buffered up to a block, then hashed and written by flush()."""
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.size = 0
+        self.pending = bytearray()
+        self.done = False
+        self.closed = False
+        self.path: Optional[Path] = None
+        self._file = None
+        self._digest = hashlib.sha256()
+
+    @property
+    def sha256(self) -> str:
+        return self._digest.hexdigest()
+
+    @property
+    def needs_flush(self) -> bool:
+        return len(self.pending) >= UPLOAD_BLOCK_SIZE or (self.done and not self.closed)
+
+    def flush(self):
+        # Blocking: run on the I/O pool
+        if self._file is None:
+            self._file = tempfile.NamedTemporaryFile(delete=False, suffix=Path(self.filename).suffix.lower())
+            self.path = Path(self._file.name)
+        if self.pending:
+            self._digest.update(self.pending)
+            self._file.write(self.pending)
+            self.pending.clear()
+        if self.done:
+            self._file.close()
+            self.closed = True
+
+    def discard(self):
+        if self._file is not None:
+            self._file.close()
+        if self.path is not None:
+            self.path.unlink(missing_ok=True)
+
+
+class _UploadParser:
+    """python-multipart callbacks; limits are checked as each piece of a part arrives."""
+
+    def __init__(self, field: str, allowed_suffixes: Optional[Collection[str]], budget: UploadBudget):
+        self.field = field
+        self.allowed_suffixes = allowed_suffixes
+        self.budget = budget
+        self.files: List[_FilePart] = []
+        self._headers: List[Tuple[bytes, bytes]] = []
+        self._header_name = b""
+        self._header_value = b""
+        self._current: Optional[_FilePart] = None
+
+    def on_part_begin(self):
+        self._headers = []
+        self._current = None
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._header_name += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        self._headers.append((self._header_name.lower(), self._header_value))
+        self._header_name = b""
+        self._header_value = b""
+
+    def on_headers_finished(self):
+        disposition = dict(self._headers).get(b"content-disposition", b"")
+        _, options = parse_options_header(disposition)
+        if options.get(b"name", b"").decode("utf-8", "replace") != self.field:
+            # Other form fields only count towards the request limit
+            return
+        filename = options.get(b"filename", b"").decode("utf-8", "replace")
+        if not filename:
+            raise HTTPException(status_code=400, detail="All files must have filenames.")
+        if self.allowed_suffixes is not None and Path(filename).suffix.lower() not in self.allowed_suffixes:
+            raise HTTPException(status_code=400, detail=f"Unsupported file type: {filename}")
+        self._current = _FilePart(filename)
+        self.files.append(self._current)
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        self.budget.consume(end - start)
+        part = self._current
+        if part is None:
+            return
+        part.size += end - start
+        if part.size > MAX_UPLOAD_FILE_BYTES:
+            raise HTTPException(
+                status_code=413,
+                detail=f"File exceeds the {MAX_UPLOAD_FILE_BYTES // (1024 * 1024)} MB limit: {part.filename}",
+            )
+        part.pending += data[start:end]
+
+    def on_part_end(self):
+        if self._current is not None:
+            self._current.done = True
+        self._current = None
+
+    def callbacks(self) -> dict:
+        names = ("on_part_begin", "on_header_field", "on_header_value", "on_header_end", "on_headers_finished", "on_part_data", "on_part_end")
+        return {name: getattr(self, name) for name in names}
+
+
+async def read_uploads(
+    request: Request,
+    field: str = "files",
+    allowed_suffixes: Optional[Collection[str]] = None,
+    budget: Optional[UploadBudget] = None,
+) -> List[Tuple[Path, str, str, int]]:
+    """
+    Parse a multipart/form-data body as it arrives and write every file in
+    `field` straight to a named temp file in UPLOAD_BLOCK_SIZE blocks, hashing
+    as it goes. Returns (path, sha256, filename, size) per file. Filenames and
+    types are checked from the part headers, and both size limits as bytes
+    arrive, so a bad or oversized upload is rejected (400/413) without reading
+    the rest, with or without a Content-Length. Nothing is kept on failure.
+    """
+    _, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if not boundary:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload.")
+
+    handler = _UploadParser(field, allowed_suffixes, budget or UploadBudget())
+    parser = MultipartParser(boundary, handler.callbacks())
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            for part in handler.files:
+                if part.needs_flush:
+                    await run_io(part.flush)
+        parser.finalize()
+        for part in handler.files:
+            if not part.done:
+                raise HTTPException(status_code=400, detail=f"Upload ended before the end of {part.filename}.")
+    except BaseException as e:
+        for part in handler.files:
+            part.discard()
+        if isinstance(e, MultipartParseError):
+            raise HTTPException(status_code=400, detail="Malformed multipart upload.") from e
+        raise
+    return [(part.path, part.sha256, part.filename, part.size) for part in handler.files]
@@ -0,0 +1,118 @@
+"""Startup timing and optional background warm-up of lazily loaded components."""
+
+from __future__ import annotations
+
+import os
+import sys
+import time
+from typing import Dict, Optional
+
+# Imported first by backend.main, so this approximates when the app started importing
+IMPORT_STARTED = time.perf_counter()
+
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "1").lower() not in {"0", "false", "no"}
+
+
+def _load_embeddings():
+    from backend.embeddings import get_embedding_service
+
+    get_embedding_service().load()
+
+
+def _load_vector_store():
+    import langchain_chroma  # noqa: F401
+
+
+def _load_llm_clients():
+    from backend.poc_app import llm, notes_llm, quiz_llm, structured_llm
+
+    for gateway in (llm, structured_llm, notes_llm, quiz_llm):
+        gateway.client
+
+
+def _load_pdf():
+    import fitz  # noqa: F401
+
+
+def _embeddings_loaded() -> bool:
+    from backend.embeddings import get_embedding_service
+
+    return get_embedding_service().loaded
+
+
+def _llm_clients_loaded() -> bool:
+    from backend.poc_app import llm, notes_llm, quiz_llm, structured_llm
+
+    return all(getattr(gateway, "loaded", True) for gateway in (llm, structured_llm, notes_llm, quiz_llm))
+
+
+# name -> (warm-up step, is it loaded); ordered cheapest first so readiness fills in quickly
+COMPONENTS: Dict[str, tuple] = {
+    "pdf": (_load_pdf, lambda: "fitz" in sys.modules),
+    "vectorStore": (_load_vector_store, lambda: "langchain_chroma" in sys.modules),
+    "llm": (_load_llm_clients, _llm_clients_loaded),
+    "embeddings": (_load_embeddings, _embeddings_loaded),
+}
+
+
+class StartupState:
+    def __init__(self):
+        self.import_seconds: Optional[float] = None
+        self.startup_seconds: Optional[float] = None
+        self.warmup = "pending" if WARMUP_ON_STARTUP else "disabled"
+        self.warmup_seconds: Optional[float] = None
+        self.step_seconds: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+
+    def imported(self):
+        self.import_seconds = time.perf_counter() - IMPORT_STARTED
+
+    def started(self):
+        self.startup_seconds = time.perf_counter() - IMPORT_STARTED
+        print(f"Startup: imports {self.import_seconds:.2f}s, ready to serve after {self.startup_seconds:.2f}s")
+
+    def warm_up(self, steps: Optional[Dict[str, tuple]] = None):
+        """Load every component, recording how long each took. Blocking: run on the worker pool."""
+        self.warmup = "running"
+        started = time.perf_counter()
+        for name, (load, _) in (steps or COMPONENTS).items():
+            step = time.perf_counter()
+            try:
+                load()
+            except Exception as e:
+                # Still loaded lazily (and retried) on first use
+                self.errors[name] = str(e) or e.__class__.__name__
+                print(f"Warm-up of {name} failed: {e}")
+            self.step_seconds[name] = round(time.perf_counter() - step, 3)
+        self.warmup_seconds = time.perf_counter() - started
+        self.warmup = "done"
+        print(f"Warm-up finished in {self.warmup_seconds:.2f}s")
+
+    @property
+    def ready(self) -> bool:
+        return self.warmup in {"done", "disabled"}
+
+    def report(self) -> dict:
+        def seconds(value: Optional[float]) -> Optional[float]:
+            return round(value, 3) if value is not None else None
+
+        return {
+            "ready": self.ready,
+            "warmup": self.warmup,
+            "components": {
+                name: {
+                    "loaded": loaded(),
+                    "seconds": self.step_seconds.get(name),
+                    "error": self.errors.get(name),
+                }
+                for name, (_, loaded) in COMPONENTS.items()
+            },
+            "startup": {
+                "importSeconds": seconds(self.import_seconds),
+                "startupSeconds": seconds(self.startup_seconds),
+                "warmupSeconds": seconds(self.warmup_seconds),
+            },
+        }
+
+
+startup_state = StartupState()
@@ -0,0 +1 @@
+"""Reproducible benchmarks and load tests for the study assistant backend. Run with `python -m benchmarks`."""
@@ -0,0 +1,191 @@
+"""
+Run the benchmark suites and store the results, compared against the
+previous run. See the Benchmarks section of README.md.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from benchmarks.corpus import KINDS
+from benchmarks.metrics import format_table
+
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+# Measure this service, not Groq's quota or earlier answers; explicit environment variables still win
+BENCHMARK_ENV = {
+    "LLM_REQUESTS_PER_MINUTE": "0",
+    "LLM_TOKENS_PER_MINUTE": "0",
+    "ANSWER_CACHE_MAX_ENTRIES": "0",
+    "WARMUP_ON_STARTUP": "0",
+}
+
+# (metric, True if higher is worse)
+COMPARED_METRICS = (("p50Ms", True), ("p95Ms", True), ("p99Ms", True), ("peakRssMb", True), ("throughputPerSecond", False))
+# Differences below this (ms or MB) are noise whatever the ratio
+MIN_DELTA = 1.0
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    def integers(value: str) -> List[int]:
+        return [int(part) for part in value.split(",") if part]
+
+    def kinds(value: str) -> List[str]:
+        chosen = [part for part in value.split(",") if part]
+        unknown = set(chosen) - set(KINDS)
+        if unknown:
+            raise argparse.ArgumentTypeError(f"unknown file types: {', '.join(sorted(unknown))}")
+        return chosen
+
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__)
+    parser.add_argument("--suite", choices=("pipeline", "load", "all"), default="all")
+    parser.add_argument("--kinds", type=kinds, default=list(KINDS), help="file types for the pipeline suite (default: txt,pdf,docx)")
+    parser.add_argument("--sizes", type=integers, default=[1000, 5000, 20000], help="corpus sizes in words (default: 1000,5000,20000)")
+    parser.add_argument("--repeats", type=int, default=3, help="create_chunks runs per file (default: 3)")
+    parser.add_argument("--queries", type=int, default=20, help="retrieval and answer queries per file (default: 20)")
+    parser.add_argument("--users", type=int, default=12, help="simulated users in the load suite (default: 12)")
+    parser.add_argument("--concurrency", type=int, default=4, help="requests in flight in the load suite (default: 4)")
+    parser.add_argument("--load-words", type=int, default=3000, help="words per uploaded document in the load suite (default: 3000)")
+    parser.add_argument("--chat-turns", type=int, default=3, help="chat questions per user (default: 3)")
+    parser.add_argument("--llm-latency-ms", type=float, default=300, help="fake LLM time to first token (default: 300)")
+    parser.add_argument("--llm-ms-per-token", type=float, default=2, help="fake LLM time per output token (default: 2)")
+    parser.add_argument("--fake-embeddings", action="store_true", help="hashed bag-of-words embeddings instead of EMBEDDING_MODEL")
+    parser.add_argument("--output-dir", type=Path, default=RESULTS_DIR)
+    parser.add_argument("--baseline", type=Path, help="results file to compare against (default: latest in --output-dir)")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="relative change reported as a regression (default: 0.25)")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit with status 1 if anything regressed")
+    parser.add_argument("--no-save", action="store_true", help="compare without storing this run")
+    parser.add_argument("--keep-workdir", action="store_true", help="keep the temporary cache, Chroma and corpus directory")
+    return parser.parse_args(argv)
+
+
+def git_revision() -> Optional[str]:
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_ROOT, capture_output=True, text=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return revision + ("-dirty" if dirty.strip() else "")
+
+
+def config(args: argparse.Namespace) -> dict:
+    """The settings that must match for two runs to be comparable."""
+    keys = ("suite", "kinds", "sizes", "repeats", "queries", "users", "concurrency", "load_words", "chat_turns", "llm_latency_ms", "llm_ms_per_token", "fake_embeddings")
+    return {key: getattr(args, key) for key in keys}
+
+
+def latest_results(directory: Path) -> Optional[Path]:
+    files = sorted(directory.glob("*.json"))
+    return files[-1] if files else None
+
+
+def compare(current: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+    """Lines describing every compared metric that got worse by more than tolerance."""
+    regressions = []
+    for name, result in current.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        for metric, higher_is_worse in COMPARED_METRICS:
+            new, old = result.get(metric), previous.get(metric)
+            if new is None or not old:
+                continue
+            change = (new - old) / old
+            worse = change > tolerance if higher_is_worse else change < -tolerance
+            if worse and (metric == "throughputPerSecond" or abs(new - old) >= MIN_DELTA):
+                regressions.append(f"{name} {metric}: {old} -> {new} ({change:+.0%})")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    output_dir = args.output_dir.resolve()
+    baseline_path = args.baseline.resolve() if args.baseline else latest_results(output_dir)
+
+    for name, value in BENCHMARK_ENV.items():
+        os.environ.setdefault(name, value)
+    # The app keeps its caches, sessions and Chroma data under the working directory
+    workdir = Path(tempfile.mkdtemp(prefix="study-assistant-bench-"))
+    os.chdir(workdir)
+    sys.path.insert(0, str(REPO_ROOT))
+
+    # Imported only now: backend modules read their settings at import time
+    from benchmarks.fakes import install_fake_embeddings, install_fake_llms
+
+    install_fake_llms(args.llm_latency_ms, args.llm_ms_per_token)
+    if args.fake_embeddings:
+        install_fake_embeddings()
+
+    stages: Dict[str, dict] = {}
+    started = time.time()
+    try:
+        if args.suite in ("pipeline", "all"):
+            from benchmarks.pipeline import run_pipeline
+
+            stages.update(run_pipeline(workdir / "corpus", args.kinds, args.sizes, args.repeats, args.queries))
+        if args.suite in ("load", "all"):
+            from benchmarks.load import run_load
+
+            stages.update(asyncio.run(run_load(workdir / "corpus", args.users, args.concurrency, args.load_words, args.chat_turns)))
+    finally:
+        os.chdir(REPO_ROOT)
+        if not args.keep_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    from backend.embeddings import EMBEDDING_MODEL_NAME
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results = {
+        "meta": {
+            "startedAt": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(started)),
+            "durationSeconds": round(time.time() - started, 1),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "embeddingModel": "fake" if args.fake_embeddings else EMBEDDING_MODEL_NAME,
+            "peakRssMb": round((peak if sys.platform == "darwin" else peak * 1024) / (1024 * 1024), 1),
+            "environment": {name: os.environ[name] for name in BENCHMARK_ENV},
+        },
+        "config": config(args),
+        "stages": stages,
+    }
+    print()
+    print(format_table(stages))
+
+    regressions: List[str] = []
+    if baseline_path is not None and baseline_path.exists():
+        baseline = json.loads(baseline_path.read_text())
+        print(f"\nCompared with {baseline_path.name} ({baseline['meta'].get('revision')}):")
+        if baseline.get("config") != results["config"]:
+            print("  warning: run settings differ from the baseline")
+        regressions = compare(stages, baseline.get("stages", {}), args.tolerance)
+        print("\n".join(f"  REGRESSION {line}" for line in regressions) or "  no regressions")
+
+    if not args.no_save:
+        output_dir.mkdir(parents=True, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(started))
+        path = output_dir / f"{stamp}-{results['meta']['revision'] or 'unknown'}.json"
+        path.write_text(json.dumps(results, indent=2) + "\n")
+        print(f"\nResults written to {path}")
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""Deterministic synthetic study material in every supported upload format."""
+
+from __future__ import annotations
+
+import random
+from pathlib import Path
+from typing import Callable, Dict, List
+
+
+KINDS = ("txt", "pdf", "docx")
+# Words per PDF page; keeps each page inside one text box
+PDF_WORDS_PER_PAGE = 350
+
+_ONSETS = ("b", "c", "d", "f", "g", "k", "l", "m", "n", "p", "r", "s", "t", "v", "th", "st", "pr", "gr")
+_VOWELS = ("a", "e", "i", "o", "u", "io", "ea")
+_CODAS = ("", "n", "r", "s", "l", "x", "m", "nd", "st")
+VOCABULARY_SIZE = 3000
+
+
+def _vocabulary() -> List[str]:
+    rng = random.Random(0)
+    words = set()
+    while len(words) < VOCABULARY_SIZE:
+        syllables = rng.randint(1, 4)
+        words.add("".join(rng.choice(_ONSETS) + rng.choice(_VOWELS) + rng.choice(_CODAS) for _ in range(syllables)))
+    return sorted(words)
+
+
+VOCABULARY = _vocabulary()
+# Zipf-like frequencies, so keyword and vector retrieval see realistic term statistics
+_WEIGHTS = [1 / (rank + 1) for rank in range(len(VOCABULARY))]
+
+
+def make_words(count: int, seed: int) -> List[str]:
+    return random.Random(seed).choices(VOCABULARY, weights=_WEIGHTS, k=count)
+
+
+def make_text(words: int, seed: int) -> str:
+    """About `words` words of sentences, paragraphs and headings; the same seed gives the same text."""
+    rng = random.Random(seed)
+    vocabulary = make_words(words, seed)
+    paragraphs = []
+    position = 0
+    while position < len(vocabulary):
+        if len(paragraphs) % 6 == 0:
+            paragraphs.append(f"Chapter {len(paragraphs) // 6 + 1}: " + " ".join(vocabulary[position:position + 3]).title())
+            position += 3
+        sentences = []
+        for _ in range(rng.randint(3, 7)):
+            length = rng.randint(8, 20)
+            sentence = vocabulary[position:position + length]
+            position += length
+            if sentence:
+                sentences.append(" ".join(sentence).capitalize() + ".")
+        paragraphs.append(" ".join(sentences))
+    return "\n\n".join(paragraph for paragraph in paragraphs if paragraph)
+
+
+def make_questions(count: int, seed: int) -> List[str]:
+    """Questions drawn from the same vocabulary as the documents."""
+    rng = random.Random(seed)
+    templates = ("What is {}?", "Explain {} and {}.", "How does {} relate to {}?", "Summarize what the notes say about {}.")
+    questions = []
+    for _ in range(count):
+        template = rng.choice(templates)
+        questions.append(template.format(*make_words(template.count("{}"), rng.randrange(1 << 30))))
+    return questions
+
+
+def write_txt(path: Path, text: str):
+    path.write_text(text, encoding="utf-8")
+
+
+def write_docx(path: Path, text: str):
+    from docx import Document as DocxDocument
+
+    document = DocxDocument()
+    for paragraph in text.split("\n\n"):
+        if paragraph.startswith("Chapter "):
+            document.add_heading(paragraph, level=2)
+        else:
+            document.add_paragraph(paragraph)
+    document.save(str(path))
+
+
+def write_pdf(path: Path, text: str):
+    import fitz
+
+    words = text.split(" ")
+    pdf = fitz.open()
+    try:
+        for start in range(0, len(words), PDF_WORDS_PER_PAGE):
+            page = pdf.new_page()
+            page.insert_textbox(page.rect + (50, 50, -50, -50), " ".join(words[start:start + PDF_WORDS_PER_PAGE]), fontsize=9)
+        pdf.save(str(path))
+    finally:
+        pdf.close()
+
+
+WRITERS: Dict[str, Callable[[Path, str], None]] = {"txt": write_txt, "pdf": write_pdf, "docx": write_docx}
+
+
+def build_file(directory: Path, kind: str, words: int, seed: int) -> Path:
+    """Write a synthetic document of `words` words; files are reused when they already exist."""
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"corpus-{words}w-{seed}.{kind}"
+    if not path.exists():
+        WRITERS[kind](path, make_text(words, seed))
+    return path
@@ -0,0 +1,163 @@
+"""
+Deterministic local stand-ins for the Groq chat models and, optionally, the
+embedding model, so benchmarks measure this service rather than the network.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import time
+from typing import AsyncIterator, List
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+
+_COUNT = re.compile(r"EXACTLY (\d+)")
+_WORD = re.compile(r"[a-z]{4,}")
+
+
+def _rng(prompt: str) -> random.Random:
+    return random.Random(hashlib.sha256(prompt.encode()).digest())
+
+
+def _words(prompt: str, rng: random.Random, count: int) -> List[str]:
+    # Answers reuse words from the prompt (i.e. the retrieved context), like a grounded answer would
+    pool = _WORD.findall(prompt.lower()) or ["answer"]
+    return [rng.choice(pool) for _ in range(count)]
+
+
+def _sentence(prompt: str, rng: random.Random, count: int) -> str:
+    return " ".join(_words(prompt, rng, count)).capitalize() + "."
+
+
+def _usage(prompt: str, content: str) -> dict:
+    # Same estimate as backend.prompting: about four characters per token
+    prompt_tokens = math.ceil(len(prompt) / 4)
+    completion_tokens = math.ceil(len(content) / 4)
+    return {"input_tokens": prompt_tokens, "output_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+
+
+class FakeChatModel:
+    """
+    Answers each prompt with text derived from a hash of the prompt, after a
+    fixed delay plus a per-output-token delay. `kind` is the gateway name and
+    picks the response format the app expects.
+    """
+
+    def __init__(self, kind: str, latency_ms: float = 300, ms_per_token: float = 2):
+        self.kind = kind
+        self.latency = latency_ms / 1000
+        self.per_token = ms_per_token / 1000
+
+    def respond(self, prompt: str) -> str:
+        rng = _rng(prompt)
+        count = _COUNT.search(prompt)
+        count = int(count.group(1)) if count else 5
+        if self.kind == "notes":
+            return json.dumps({
+                "title": " ".join(_words(prompt, rng, 3)).title(),
+                "summary": " ".join(_sentence(prompt, rng, 15) for _ in range(2)),
+                "key_points": [_sentence(prompt, rng, 10) for _ in range(5)],
+                "detailed_notes": "\n\n".join(_sentence(prompt, rng, 40) for _ in range(4)),
+            })
+        if self.kind == "quiz":
+            questions = []
+            for _ in range(count):
+                options = [_sentence(prompt, rng, 3) for _ in range(4)]
+                questions.append({
+                    "question": _sentence(prompt, rng, 10)[:-1] + "?",
+                    "options": options,
+                    "correct_answer": options[rng.randrange(4)],
+                    "explanation": _sentence(prompt, rng, 12),
+                })
+            return json.dumps({"questions": questions})
+        if self.kind == "flashcards":
+            return json.dumps({"cards": [{"q": _sentence(prompt, rng, 8)[:-1] + "?", "a": _sentence(prompt, rng, 15)} for _ in range(count)]})
+        return " ".join(_sentence(prompt, rng, rng.randint(8, 16)) for _ in range(3))
+
+    def _delay(self, content: str) -> float:
+        return self.latency + self.per_token * math.ceil(len(content) / 4)
+
+    def _message(self, prompt: str) -> AIMessage:
+        content = self.respond(prompt)
+        return AIMessage(content=content, usage_metadata=_usage(prompt, content))
+
+    def invoke(self, prompt: str):
+        message = self._message(prompt)
+        time.sleep(self._delay(message.content))
+        return message
+
+    async def ainvoke(self, prompt: str):
+        message = self._message(prompt)
+        await asyncio.sleep(self._delay(message.content))
+        return message
+
+    async def astream(self, prompt: str) -> AsyncIterator[AIMessageChunk]:
+        content = self.respond(prompt)
+        await asyncio.sleep(self.latency)
+        words = content.split(" ")
+        for i, word in enumerate(words):
+            piece = word if i == len(words) - 1 else word + " "
+            await asyncio.sleep(self.per_token * math.ceil(len(piece) / 4))
+            yield AIMessageChunk(content=piece)
+
+
+class FakeStructuredModel(FakeChatModel):
+    """FakeChatModel for `with_structured_output` clients: returns the parsed schema object."""
+
+    def __init__(self, schema, kind: str, latency_ms: float = 300, ms_per_token: float = 2):
+        super().__init__(kind, latency_ms, ms_per_token)
+        self.schema = schema
+
+    def invoke(self, prompt: str):
+        return self.schema.model_validate_json(super().invoke(prompt).content)
+
+    async def ainvoke(self, prompt: str):
+        return self.schema.model_validate_json((await super().ainvoke(prompt)).content)
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Hashed bag-of-words vectors: deterministic, instant, and texts sharing
+    words are still close, so retrieval returns sensible chunks.
+    """
+
+    def __init__(self, dimensions: int = 384):
+        self.dimensions = dimensions
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimensions
+        for word in _WORD.findall(text.lower()):
+            digest = hashlib.blake2b(word.encode(), digest_size=8).digest()
+            vector[int.from_bytes(digest[:4], "little") % self.dimensions] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+        return [value / norm for value in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+def install_fake_llms(latency_ms: float, ms_per_token: float):
+    """Point every LLM gateway at a fake client. Must run before the gateways build their clients."""
+    from backend import poc_app
+
+    for gateway in (poc_app.llm, poc_app.notes_llm, poc_app.quiz_llm):
+        gateway.factory = lambda kind=gateway.name: FakeChatModel(kind, latency_ms, ms_per_token)
+    poc_app.structured_llm.factory = lambda: FakeStructuredModel(poc_app.FlashcardList, "flashcards", latency_ms, ms_per_token)
+
+
+def install_fake_embeddings(dimensions: int = 384):
+    """Use FakeEmbeddings instead of loading the sentence-transformers model."""
+    from backend.embeddings import get_embedding_service
+
+    # The service still batches requests on its encoder thread; only the model is replaced
+    get_embedding_service()._model = FakeEmbeddings(dimensions)
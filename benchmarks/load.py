@@ -0,0 +1,74 @@
+"""Concurrent end-to-end load against backend.main:app: upload, then notes, then chat."""
+
+from __future__ import annotations
+
+import asyncio
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from benchmarks.corpus import KINDS, build_file, make_questions
+from benchmarks.metrics import Stage
+
+
+MEDIA_TYPES = {
+    "txt": "text/plain",
+    "pdf": "application/pdf",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+}
+
+
+async def run_load(directory: Path, users: int, concurrency: int, words: int, chat_turns: int) -> Dict[str, dict]:
+    """
+    Each simulated user uploads their own document (file types alternate),
+    generates notes, then asks `chat_turns` questions. Stages run one after
+    another, so each stage's peak RSS and throughput are its own; at most
+    `concurrency` requests are in flight at once.
+    """
+    import httpx
+
+    from backend.main import app
+    from backend.warmup import startup_state
+
+    limit = asyncio.Semaphore(concurrency)
+    # Distinct seeds: identical uploads would be deduplicated and their results cached
+    files = [build_file(directory, KINDS[user % len(KINDS)], words, seed=100_000 + user) for user in range(users)]
+    file_ids: List[Optional[str]] = [None] * users
+    results: Dict[str, dict] = {}
+
+    async with app.router.lifespan_context(app):
+        # One-time model and client loading belongs to startup, not to the first stage
+        await asyncio.to_thread(startup_state.warm_up)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+
+            async def call(stage: Stage, url: str, **kwargs) -> httpx.Response:
+                async with limit:
+                    with stage.measure():
+                        response = await client.post(url, **kwargs)
+                        response.raise_for_status()
+                return response
+
+            async def upload(stage: Stage, user: int):
+                path = files[user]
+                content = path.read_bytes()
+                response = await call(stage, "/api/upload", files=[("files", (path.name, content, MEDIA_TYPES[path.suffix[1:]]))])
+                file_ids[user] = response.json()["fileId"]
+
+            async def notes(stage: Stage, user: int):
+                await call(stage, "/api/generate-notes", json={"fileId": file_ids[user]})
+
+            async def chat(stage: Stage, user: int):
+                # A user's questions are sequential, like a real conversation
+                for question in make_questions(chat_turns, seed=user):
+                    await call(stage, "/api/chat", json={"fileId": file_ids[user], "question": question})
+
+            for name, step in (("upload", upload), ("notes", notes), ("chat", chat)):
+                active = [user for user in range(users) if name == "upload" or file_ids[user] is not None]
+                with Stage(f"load.{name}") as stage:
+                    outcomes = await asyncio.gather(*(step(stage, user) for user in active), return_exceptions=True)
+                errors = [outcome for outcome in outcomes if isinstance(outcome, Exception)]
+                if errors:
+                    print(f"load.{name}: {len(errors)} failed, e.g. {errors[0]!r}")
+                results[stage.name] = stage.result()
+                print(f"load.{name}: {len(active)} users done in {stage.wall_seconds:.2f}s")
+    return results
@@ -0,0 +1,116 @@
+"""Latency percentiles, throughput and peak resident memory per benchmark stage."""
+
+from __future__ import annotations
+
+import math
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence
+
+
+RSS_SAMPLE_INTERVAL_SECONDS = 0.01
+
+
+def rss_bytes() -> int:
+    """Current resident set size of this process."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # No procfs (e.g. macOS): fall back to the peak so far
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def percentile(ordered: Sequence[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted sequence."""
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def summarize(samples: Sequence[float], wall_seconds: float) -> dict:
+    ordered = sorted(samples)
+    if not ordered:
+        return {"count": 0}
+
+    def ms(seconds: float) -> float:
+        return round(seconds * 1000, 2)
+
+    return {
+        "count": len(ordered),
+        "meanMs": ms(sum(ordered) / len(ordered)),
+        "p50Ms": ms(percentile(ordered, 50)),
+        "p95Ms": ms(percentile(ordered, 95)),
+        "p99Ms": ms(percentile(ordered, 99)),
+        "maxMs": ms(ordered[-1]),
+        "throughputPerSecond": round(len(ordered) / wall_seconds, 3) if wall_seconds > 0 else None,
+    }
+
+
+class Stage:
+    """
+    One benchmark stage: times each operation recorded with measure(), and
+    samples RSS on a background thread for the stage's peak memory.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.samples: List[float] = []
+        self.errors = 0
+        self.wall_seconds = 0.0
+        self.peak_rss = 0
+        self._started = 0.0
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak_rss = max(self.peak_rss, rss_bytes())
+            self._stop.wait(RSS_SAMPLE_INTERVAL_SECONDS)
+
+    def __enter__(self) -> "Stage":
+        self.peak_rss = rss_bytes()
+        self._sampler = threading.Thread(target=self._sample, name=f"rss-{self.name}", daemon=True)
+        self._sampler.start()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.wall_seconds = time.perf_counter() - self._started
+        self._stop.set()
+        self._sampler.join()
+        self.peak_rss = max(self.peak_rss, rss_bytes())
+
+    @contextmanager
+    def measure(self):
+        """Time the enclosed operation; it counts as an error instead if it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.errors += 1
+            raise
+        self.samples.append(time.perf_counter() - started)
+
+    def result(self) -> dict:
+        return {
+            **summarize(self.samples, self.wall_seconds),
+            "errors": self.errors,
+            "wallSeconds": round(self.wall_seconds, 3),
+            "peakRssMb": round(self.peak_rss / (1024 * 1024), 1),
+        }
+
+
+def format_table(stages: Dict[str, dict]) -> str:
+    columns = {
+        "count": "count", "errors": "errors", "p50Ms": "p50 ms", "p95Ms": "p95 ms", "p99Ms": "p99 ms",
+        "throughputPerSecond": "per sec", "peakRssMb": "peak MB",
+    }
+    width = max([len("stage")] + [len(name) for name in stages])
+    lines = ["stage".ljust(width) + "".join(f"{header:>10}" for header in columns.values())]
+    for name, result in stages.items():
+        lines.append(name.ljust(width) + "".join(f"{str(result.get(column, '-')):>10}" for column in columns))
+    return "\n".join(lines)
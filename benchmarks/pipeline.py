@@ -0,0 +1,59 @@
+"""In-process benchmarks of the hot paths: chunking, indexing, retrieval and answering."""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Dict, Sequence
+
+from benchmarks.corpus import build_file, make_questions
+from benchmarks.metrics import Stage
+
+
+def run_pipeline(directory: Path, kinds: Sequence[str], sizes: Sequence[int], repeats: int, queries: int) -> Dict[str, dict]:
+    """
+    For each file type and size: create_chunks (repeated), one vector index
+    build through create_vector_db, then retrieve_context and answer_question
+    for `queries` questions against the hybrid session index.
+    """
+    from backend.chunk_store import ChunkStore
+    from backend.documents import SessionIndex, StoredDocument, hash_file
+    from backend.poc_app import answer_question, create_chunks, retrieve_context
+
+    results: Dict[str, dict] = {}
+    for kind in kinds:
+        for words in sizes:
+            label = f"{kind}.{words}w"
+            path = build_file(directory, kind, words, seed=words)
+
+            with Stage(f"chunk.{label}") as stage:
+                for _ in range(repeats):
+                    with stage.measure():
+                        chunks = create_chunks(path, path.name)
+            results[stage.name] = {**stage.result(), "chunks": len(chunks)}
+
+            doc_id = hash_file(path)
+            document = StoredDocument(doc_id=doc_id, path=path, filename=path.name, chunks=ChunkStore.from_documents(chunks, doc_id))
+            try:
+                with Stage(f"index.{label}") as stage:
+                    with stage.measure():
+                        document.ensure_index()
+                results[stage.name] = stage.result()
+
+                index = SessionIndex([document], [path.name])
+                questions = make_questions(queries, seed=words)
+                with Stage(f"retrieve.{label}") as stage:
+                    for question in questions:
+                        with stage.measure():
+                            retrieve_context(question, index)
+                results[stage.name] = stage.result()
+
+                with Stage(f"answer.{label}") as stage:
+                    for question in questions:
+                        with stage.measure():
+                            answer_question(question, index)
+                results[stage.name] = stage.result()
+            finally:
+                # Drops the collection and the corpus file; build_file recreates it next run
+                document.close()
+            print(f"pipeline {label}: {len(chunks)} chunks")
+    return results
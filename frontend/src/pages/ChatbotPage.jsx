@@ -7,6 +7,7 @@ const API_URL = import.meta.env.VITE_API_URL || (import.meta.env.PROD ? "" : "ht
 function ChatbotPage({ fileInfo, chatState, setChatState }) {
     const [inputValue, setInputValue] = useState("");
     const [isLoading, setIsLoading] = useState(false);
+    const [isStreaming, setIsStreaming] = useState(false);
     const [error, setError] = useState("");
     const messagesEndRef = useRef(null);
 
@@ -46,7 +47,7 @@ function ChatbotPage({ fileInfo, chatState, setChatState }) {
         setError("");
 
         try {
-            const response = await fetch(`${API_URL}/api/chat`, {
+            const response = await fetch(`${API_URL}/api/chat/stream`, {
                 method: "POST",
                 headers: {
                     "Content-Type": "application/json",
@@ -62,20 +63,60 @@ function ChatbotPage({ fileInfo, chatState, setChatState }) {
                 throw new Error(message || "Failed to get response.");
             }
 
-            const data = await response.json();
-
             const botMessage = {
                 type: 'bot',
-                text: data.answer,
-                sources: data.sources,
+                text: "",
+                sources: "",
                 timestamp: new Date().toLocaleTimeString()
             };
 
-            // Append bot message after user message
+            // Append the bot message once and fill it in as events arrive
             setChatState(prev => ({
                 ...prev,
                 messages: [...prev.messages, botMessage]
             }));
+            setIsStreaming(true);
+
+            const updateBotMessage = (update) => {
+                setChatState(prev => {
+                    const updated = [...prev.messages];
+                    const last = updated[updated.length - 1];
+                    updated[updated.length - 1] = { ...last, ...update(last) };
+                    return { ...prev, messages: updated };
+                });
+            };
+
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = "";
+
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+
+                // Server-sent events are separated by a blank line
+                const events = buffer.split("\n\n");
+                buffer = events.pop();
+
+                for (const rawEvent of events) {
+                    let eventName = "message";
+                    let data = "";
+                    for (const line of rawEvent.split("\n")) {
+                        if (line.startsWith("event: ")) eventName = line.slice(7);
+                        else if (line.startsWith("data: ")) data += line.slice(6);
+                    }
+                    const payload = data ? JSON.parse(data) : {};
+
+                    if (eventName === "sources") {
+                        updateBotMessage(() => ({ sources: payload.sources }));
+                    } else if (eventName === "token") {
+                        updateBotMessage(last => ({ text: last.text + payload.text }));
+                    } else if (eventName === "error") {
+                        updateBotMessage(() => ({ text: payload.message }));
+                    }
+                }
+            }
         } catch (err) {
             setError(err.message || "Unable to get response.");
             const errorMessage = {
@@ -90,6 +131,7 @@ function ChatbotPage({ fileInfo, chatState, setChatState }) {
             }));
         } finally {
             setIsLoading(false);
+            setIsStreaming(false);
         }
     };
 
@@ -150,7 +192,7 @@ function ChatbotPage({ fileInfo, chatState, setChatState }) {
                             </div>
                         ))}
 
-                        {isLoading && (
+                        {isLoading && !isStreaming && (
                             <div className="message bot">
                                 <div className="message-avatar">🤖</div>
                                 <div className="message-content">
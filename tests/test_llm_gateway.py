@@ -0,0 +1,104 @@
+"""Circuit breaker behaviour of the LLM gateway, against a scripted client."""
+
+import asyncio
+import time
+import unittest
+
+from backend.llm_gateway import CircuitBreaker, CircuitOpenError, LLMGateway, TokenBucket
+
+
+COOLDOWN = 0.05
+
+
+class ProviderError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class ScriptedClient:
+    """Raises the queued errors in order, then answers every call."""
+
+    def __init__(self, *errors: Exception):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def _next(self, prompt: str) -> str:
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return f"answer to {prompt}"
+
+    def invoke(self, prompt: str) -> str:
+        return self._next(prompt)
+
+    async def ainvoke(self, prompt: str) -> str:
+        return self._next(prompt)
+
+
+def open_gateway(name: str, client: ScriptedClient) -> LLMGateway:
+    """A gateway whose breaker has just opened and whose rate limits are off."""
+    gateway = LLMGateway(lambda: client, model=f"test-{name}", name=name)
+    gateway.state.requests = TokenBucket(0)
+    gateway.state.tokens = TokenBucket(0)
+    gateway.state.breaker = CircuitBreaker(threshold=1, cooldown=COOLDOWN)
+    gateway.state.breaker.record_failure()
+    return gateway
+
+
+class HalfOpenTrialTest(unittest.TestCase):
+    def test_transient_trial_failure_reopens_then_recovers(self):
+        client = ScriptedClient(ProviderError(503))
+        gateway = open_gateway("trial-async", client)
+        breaker = gateway.state.breaker
+
+        time.sleep(COOLDOWN)
+        with self.assertRaises(ProviderError):
+            asyncio.run(gateway.ainvoke("first"))
+        # The trial is not retried; its failure re-opens the circuit and frees the slot
+        self.assertEqual(client.calls, 1)
+        self.assertEqual(breaker.state, "open")
+        self.assertFalse(breaker.trial_in_flight)
+        with self.assertRaises(CircuitOpenError):
+            asyncio.run(gateway.ainvoke("too soon"))
+
+        time.sleep(COOLDOWN)
+        self.assertEqual(asyncio.run(gateway.ainvoke("second")), "answer to second")
+        self.assertEqual(breaker.state, "closed")
+        self.assertEqual(asyncio.run(gateway.ainvoke("third")), "answer to third")
+
+    def test_transient_trial_failure_sync(self):
+        client = ScriptedClient(ProviderError(503))
+        gateway = open_gateway("trial-sync", client)
+
+        time.sleep(COOLDOWN)
+        with self.assertRaises(ProviderError):
+            gateway.invoke("first")
+        self.assertFalse(gateway.state.breaker.trial_in_flight)
+
+        time.sleep(COOLDOWN)
+        self.assertEqual(gateway.invoke("second"), "answer to second")
+        self.assertEqual(gateway.state.breaker.state, "closed")
+
+    def test_cancelled_trial_frees_the_slot(self):
+        class SlowClient(ScriptedClient):
+            async def ainvoke(self, prompt: str) -> str:
+                await asyncio.sleep(10)
+
+        gateway = open_gateway("trial-cancel", SlowClient())
+
+        async def cancel_trial():
+            task = asyncio.create_task(gateway._ainvoke("slow"))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        time.sleep(COOLDOWN)
+        asyncio.run(cancel_trial())
+        self.assertFalse(gateway.state.breaker.trial_in_flight)
+        self.assertEqual(gateway.state.breaker.admit(), True)
+
+
+if __name__ == "__main__":
+    unittest.main()